@@ -15,16 +15,25 @@ from pathlib import Path
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Quick-start development settings - unsuitable for production
+# Deployment settings are read from the environment, the defaults are only
+# suitable for local development
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-#9)qvi)1*axhh0(87+!ej(il&__#-qmf359r53ujy*z=)9$ei!'
+SECRET_KEY = os.environ.get(
+    'SECRET_KEY',
+    'django-insecure-#9)qvi)1*axhh0(87+!ej(il&__#-qmf359r53ujy*z=)9$ei!'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', '0') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.environ.get('ALLOWED_HOSTS', 'localhost,127.0.0.1')
+    .split(',')
+    if host.strip()
+]
 
 # Application definition
 
@@ -50,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -77,14 +87,66 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Seconds a connection stays checked out between requests, 0 returns
+        # it to the pool after each request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        # Connections kept open by each process, set DB_POOL=0 to connect
+        # without pooling, for example through pgbouncer
+        'POOL': {
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'MAX_OVERFLOW': int(os.environ.get('DB_POOL_MAX_OVERFLOW', 5)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'CHECK_INTERVAL': float(
+                os.environ.get('DB_POOL_CHECK_INTERVAL', 30)
+            ),
+            'MAX_AGE': float(os.environ.get('DB_POOL_MAX_AGE', 3600)),
+        } if os.environ.get('DB_POOL', '1') == '1' else None,
+        # Set DB_PGBOUNCER=1 behind pgbouncer in transaction mode, which
+        # can't keep server-side cursors open across transactions
+        'DISABLE_SERVER_SIDE_CURSORS':
+            os.environ.get('DB_PGBOUNCER', '0') == '1',
     }
 }
 
+# Read replicas
+# Hosts in DB_REPLICA_HOSTS become the aliases replica1, replica2, ... with
+# the credentials of the primary. Safe requests read from them, except for
+# REPLICA_STICKY_SECONDS after a write by the same client. Those pins are
+# kept in the CACHES entry named by REPLICA_PIN_CACHE_ALIAS, which has to be
+# shared by all processes, such as memcached or Redis.
+
+REPLICA_DATABASES = []
+
+for number, host in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+# round-robin or least-lag
+REPLICA_SELECTION = os.environ.get('REPLICA_SELECTION', 'round-robin')
+
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 10))
+
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+REPLICA_PIN_CACHE_ALIAS = os.environ.get('REPLICA_PIN_CACHE_ALIAS')
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -103,6 +165,41 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# PASSWORD_HASHER (pbkdf2, argon2 or bcrypt) hashes new passwords, the
+# others still check existing hashes, which are rehashed on login
+
+PREFERRED_PASSWORD_HASHER = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+}[os.environ.get('PASSWORD_HASHER', 'pbkdf2')]
+
+PASSWORD_HASHERS = [PREFERRED_PASSWORD_HASHER] + [
+    hasher for hasher in (
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    )
+    if hasher != PREFERRED_PASSWORD_HASHER
+]
+
+# Failed logins
+# Token requests for an email from an address, or from an address, are
+# refused without checking the password once they failed the limit within
+# the window
+
+LOGIN_FAILURE_WINDOW = int(os.environ.get('LOGIN_FAILURE_WINDOW', 300))
+
+LOGIN_FAILURE_EMAIL_LIMIT = int(os.environ.get('LOGIN_FAILURE_EMAIL_LIMIT', 5))
+
+LOGIN_FAILURE_ADDRESS_LIMIT = int(
+    os.environ.get('LOGIN_FAILURE_ADDRESS_LIMIT', 50)
+)
+
+LOGIN_FAILURE_CACHE_ALIAS = 'default'
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -127,3 +224,42 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
+
+# Django REST framework
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Token authentication cache
+# Seconds a token stays cached, and the name of a CACHES entry keeping
+# cached tokens for all processes, so revoking one takes effect in each
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+
+AUTH_TOKEN_CACHE_MAX_SIZE = 10000
+
+AUTH_TOKEN_CACHE_ALIAS = os.environ.get('AUTH_TOKEN_CACHE_ALIAS')
+
+# List response cache
+# Seconds rendered list responses stay in the CACHES entry named below
+
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+RESPONSE_CACHE_ALIAS = 'default'
+
+# Change log
+# Days tombstones of deleted rows are kept by compact_changes, clients
+# syncing from before an older deletion reload their collection
+
+CHANGE_LOG_RETENTION_DAYS = int(
+    os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30)
+)
+
+# Pantry matching
+# Users whose recipe ingredient bitmaps each process keeps in memory
+
+PANTRY_INDEX_MAX_USERS = int(os.environ.get('PANTRY_INDEX_MAX_USERS', 100))
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def cached_user_fields():
+    """Return the fields of users kept in the token cache"""
+    return [field for field in get_user_model()._meta.concrete_fields
+            if field.name != 'password']
+
+
+class TokenCache:
+    """Cache mapping token keys to their users
+
+    The concrete fields of a user are cached, except for the password hash
+    which is loaded from the database when accessed. Without a cache alias
+    entries live in an in-process LRU and expire after a timeout, so a
+    revoked token keeps working in other processes until then. With a cache
+    alias entries are only kept in that Django cache, so deleting one
+    revokes the token in every process sharing it. Saving a user drops its
+    tokens, so the cached fields don't go stale.
+    """
+
+    key_prefix = 'auth-token:'
+
+    def __init__(self, timeout, max_size, alias=None):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        """Return the shared Django cache, if configured"""
+        return caches[self.alias] if self.alias else None
+
+    def get(self, key):
+        """Return the active user cached for a token key or None"""
+        if self.shared is not None:
+            entry = self.shared.get(self.key_prefix + key)
+        else:
+            entry = self._get_local(key)
+        if entry is None or not entry['is_active']:
+            return None
+        return get_user_model().from_db(
+            None, list(entry), list(entry.values())
+        )
+
+    def set(self, key, user):
+        """Cache the user of a token key"""
+        entry = {field.attname: getattr(user, field.attname)
+                 for field in cached_user_fields()}
+        if self.shared is not None:
+            self.shared.set(self.key_prefix + key, entry, self.timeout)
+        else:
+            self._store(key, entry)
+
+    def delete(self, key):
+        """Remove a token key from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(self.key_prefix + key)
+
+    def clear(self):
+        """Remove all the entries of the in-process cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(
+    timeout=getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 60),
+    max_size=getattr(settings, 'AUTH_TOKEN_CACHE_MAX_SIZE', 10000),
+    alias=getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', None)
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication skipping the database for cached tokens"""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
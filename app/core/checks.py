@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_replica_pin_cache(app_configs, **kwargs):
+    """Check that clients pinned to the primary after a write are kept in
+    a cache shared by all processes when read replicas are configured"""
+    if not getattr(settings, 'REPLICA_DATABASES', []):
+        return []
+    alias = getattr(settings, 'REPLICA_PIN_CACHE_ALIAS', None)
+    if alias is None:
+        return [checks.Error(
+            'REPLICA_PIN_CACHE_ALIAS must be set when REPLICA_DATABASES '
+            'are configured.',
+            hint='Name a CACHES entry shared by all processes, so a client '
+                 'reads its own writes whichever process serves it.',
+            id='core.E001',
+        )]
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend is None:
+        return [checks.Error(
+            f'REPLICA_PIN_CACHE_ALIAS names the missing cache {alias!r}.',
+            id='core.E002',
+        )]
+    if backend in PROCESS_LOCAL_CACHES:
+        return [checks.Error(
+            f'REPLICA_PIN_CACHE_ALIAS names the cache {alias!r}, which '
+            f'is not shared between processes.',
+            hint='Use a backend such as memcached or Redis.',
+            id='core.E003',
+        )]
+    return []
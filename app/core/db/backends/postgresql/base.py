@@ -0,0 +1,104 @@
+"""PostgreSQL backend checking connections out of a per-process pool
+
+Pooling is configured by a POOL entry in the database settings, with the
+keys MIN_SIZE, MAX_SIZE, MAX_OVERFLOW, TIMEOUT, CHECK_INTERVAL and MAX_AGE.
+Without it the backend behaves like django.db.backends.postgresql.
+"""
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool
+from core.db.backends.postgresql.creation import DatabaseCreation
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def check_connection(connection):
+    """Return whether a connection answers a trivial query, leaving it
+    idle in autocommit mode"""
+    if connection.closed:
+        return False
+    reset_connection(connection)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return True
+
+
+def reset_connection(connection):
+    """Roll back a transaction left open on a connection and restore
+    autocommit, so it can't hold locks or a snapshot while pooled"""
+    status = connection.get_transaction_status()
+    if connection.closed or status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        raise base.Database.InterfaceError('Connection is not usable')
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    if not connection.autocommit:
+        connection.autocommit = True
+
+
+def pool_stats():
+    """Return the statistics of the pools of this process"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.stats() for (alias, _), pool in pools}
+
+
+def close_pools():
+    """Close the idle connections of the pools of this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        """Return the pool for the connection parameters, if pooling is
+        configured"""
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+        # Test database setup connects to another database under the same
+        # alias, so pools are keyed by the parameters as well
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    lambda: super(DatabaseWrapper, self).get_new_connection(
+                        conn_params
+                    ),
+                    min_size=options.get('MIN_SIZE', 0),
+                    max_size=options.get('MAX_SIZE', 10),
+                    max_overflow=options.get('MAX_OVERFLOW', 0),
+                    timeout=options.get('TIMEOUT', 30),
+                    check=check_connection,
+                    check_interval=options.get('CHECK_INTERVAL', 0),
+                    max_age=options.get('MAX_AGE'),
+                    reset=reset_connection
+                )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        self._pool = self.get_pool(conn_params)
+        if self._pool is None:
+            return super().get_new_connection(conn_params)
+        connection = self._pool.get()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level',
+            connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        pool = getattr(self, '_pool', None)
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection)
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available in time"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections
+
+    Up to max_size connections are kept open and reused. When all are in
+    use, up to max_overflow more are opened and closed on return. Further
+    checkouts wait up to timeout seconds for a connection to be returned.
+    Connections idle for check_interval seconds or more are checked with
+    check before reuse, and discarded if it fails or raises.
+    """
+
+    def __init__(self, connect, min_size=0, max_size=10, max_overflow=0,
+                 timeout=30, check=None, check_interval=0, max_age=None,
+                 reset=None):
+        if not 0 <= min_size <= max_size:
+            raise ValueError('min_size must be between 0 and max_size')
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.check = check
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.reset = reset
+
+        self._condition = threading.Condition()
+        self._reset_state()
+        self.fill()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        # Idle connections with the time they were opened and returned
+        self._idle = deque()
+        self._opened_at = {}
+        self._overflow = set()
+        self._size = 0
+        self._metrics = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'overflows': 0,
+            'timeouts': 0,
+            'failed_checks': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+        }
+
+    def _check_pid(self):
+        """Forget connections inherited from a parent process"""
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    def fill(self):
+        """Open connections until min_size are idle or in use"""
+        while True:
+            with self._condition:
+                self._check_pid()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            connection = self._open()
+            with self._condition:
+                self._idle.append((connection, time.monotonic()))
+                self._condition.notify()
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._opened_at[id(connection)] = time.monotonic()
+            self._metrics['connections_opened'] += 1
+        return connection
+
+    def get(self):
+        """Check out a connection, opening one if none is idle"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            with self._condition:
+                self._check_pid()
+                while not self._idle and \
+                        self._size >= self.max_size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No connection available in {self.timeout}s'
+                        )
+                    self._condition.wait(remaining)
+
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                else:
+                    connection = None
+                    if self._size >= self.max_size:
+                        self._metrics['overflows'] += 1
+                        overflow = True
+                    else:
+                        overflow = False
+                    self._size += 1
+
+            if connection is None:
+                connection = self._open()
+                if overflow:
+                    with self._condition:
+                        self._overflow.add(id(connection))
+            elif not self._is_usable(connection, returned_at):
+                self.discard(connection)
+                continue
+
+            waited = time.monotonic() - start
+            with self._condition:
+                self._metrics['checkouts'] += 1
+                self._metrics['wait_time'] += waited
+                self._metrics['max_wait_time'] = max(
+                    self._metrics['max_wait_time'], waited
+                )
+            return connection
+
+    def _is_usable(self, connection, returned_at):
+        now = time.monotonic()
+        if self.max_age is not None and \
+                now - self._opened_at[id(connection)] >= self.max_age:
+            return False
+        if self.check is None or now - returned_at < self.check_interval:
+            return True
+        try:
+            usable = self.check(connection)
+        except Exception:
+            usable = False
+        if not usable:
+            with self._condition:
+                self._metrics['failed_checks'] += 1
+        return usable
+
+    def put(self, connection):
+        """Return a checked out connection to the pool"""
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            overflow = id(connection) in self._overflow
+        if overflow:
+            self.discard(connection)
+            return
+        if self.reset is not None:
+            try:
+                self.reset(connection)
+            except Exception:
+                self.discard(connection)
+                return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        """Close a checked out connection and free its place in the pool"""
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            self._overflow.discard(id(connection))
+            self._opened_at.pop(id(connection), None)
+            self._size -= 1
+            self._condition.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close the idle connections"""
+        with self._condition:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            for connection in idle:
+                self._opened_at.pop(id(connection), None)
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Return the size of the pool and its counters"""
+        with self._condition:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                **self._metrics,
+            }
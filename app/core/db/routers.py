@@ -0,0 +1,121 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.utils import DatabaseError
+
+# The replica chosen for the current use_replicas() block, under 'alias'
+# once the first read of the block picked it
+_replica_choice = ContextVar('replica_choice', default=None)
+
+# The writes of the current track_writes() block, with 'wrote' set once
+# one was routed
+_write_state = ContextVar('write_state', default=None)
+
+
+@contextmanager
+def use_replicas():
+    """Route reads in the block to one of the read replicas, picked on the
+    first read, so that all of them see the same snapshot of replication"""
+    token = _replica_choice.set({})
+    try:
+        yield
+    finally:
+        _replica_choice.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """Yield a dict in which 'wrote' is set once the block routes a write"""
+    state = {}
+    token = _write_state.set(state)
+    try:
+        yield state
+    finally:
+        _write_state.reset(token)
+
+
+def measure_lag(alias):
+    """Return the seconds a replica is behind the primary"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COALESCE(EXTRACT(EPOCH FROM '
+            'now() - pg_last_xact_replay_timestamp()), 0)'
+        )
+        return float(cursor.fetchone()[0])
+
+
+class ReplicaRouter:
+    """Route reads inside use_replicas() to the REPLICA_DATABASES
+
+    Each block reads from one replica, picked round-robin, or with
+    REPLICA_SELECTION set to 'least-lag' the one furthest ahead, measured at
+    most every REPLICA_LAG_CHECK_INTERVAL seconds. Reads fall back to the
+    primary when no replica is within REPLICA_MAX_LAG seconds, and inside
+    transactions on the primary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0
+        self._lags = {}
+
+    def choose_replica(self):
+        """Return the alias of the database to read from"""
+        replicas = getattr(settings, 'REPLICA_DATABASES', [])
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        if getattr(settings, 'REPLICA_SELECTION', 'round-robin') == \
+                'least-lag':
+            lags = {alias: self.get_lag(alias) for alias in replicas}
+            alias = min(replicas, key=lags.get)
+            if lags[alias] > getattr(settings, 'REPLICA_MAX_LAG', 10):
+                return DEFAULT_DB_ALIAS
+            return alias
+        with self._lock:
+            alias = replicas[self._next % len(replicas)]
+            self._next += 1
+        return alias
+
+    def get_lag(self, alias):
+        """Return the last measured lag of a replica, infinite if it
+        could not be measured"""
+        interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._lags.get(alias)
+        if cached is not None and now - cached[1] < interval:
+            return cached[0]
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError:
+            lag = float('inf')
+        with self._lock:
+            self._lags[alias] = (lag, now)
+        return lag
+
+    def db_for_read(self, model, **hints):
+        choice = _replica_choice.get()
+        if choice is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if 'alias' not in choice:
+            choice['alias'] = self.choose_replica()
+        return choice['alias']
+
+    def db_for_write(self, model, **hints):
+        state = _write_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
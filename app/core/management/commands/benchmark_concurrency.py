@@ -0,0 +1,107 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.benchmark_search import percentile
+
+
+async def fetch(url, headers, timeout):
+    """Send a GET request over a new connection and return its status"""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(
+            parts.hostname,
+            port,
+            ssl=parts.scheme == 'https'
+        ),
+        timeout
+    )
+    try:
+        lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}',
+                 'Connection: close']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+class Command(BaseCommand):
+    """Django command to measure a server under concurrent connections"""
+
+    help = (
+        'Sends GET requests to a URL from many concurrent connections and '
+        'reports throughput and latency. Run it against the WSGI and ASGI '
+        'servers in turn; the open file limit must exceed the connections.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--token', help='Authentication token to send')
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        if urlsplit(options['url']).scheme not in ('http', 'https'):
+            raise CommandError('The URL must be http or https')
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        start = time.perf_counter()
+        latencies, errors = asyncio.run(self.run(
+            options['url'],
+            headers,
+            options['connections'],
+            options['requests'],
+            options['timeout']
+        ))
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            '{} requests over {} connections in {:.1f}s, {:.0f} req/s, '
+            '{} errors'.format(
+                options['requests'], options['connections'], elapsed,
+                len(latencies) / elapsed, errors
+            )
+        )
+        if latencies:
+            for name, fraction in (('p50', 0.5), ('p95', 0.95),
+                                   ('p99', 0.99)):
+                self.stdout.write('  {} {:.2f} ms'.format(
+                    name, percentile(latencies, fraction) * 1000
+                ))
+
+    async def run(self, url, headers, connections, requests, timeout):
+        """Return the sorted latencies of successful requests and the
+        number of failed ones"""
+        latencies = []
+        errors = 0
+        remaining = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    status = await fetch(url, headers, timeout)
+                except (OSError, asyncio.TimeoutError, ValueError,
+                        IndexError):
+                    status = None
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(connections)))
+        return sorted(latencies), errors
@@ -0,0 +1,74 @@
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import get_hashers_by_algorithm, make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from user.throttling import login_failures
+
+
+class Command(BaseCommand):
+    """Django command to measure logins per second on one core"""
+
+    help = (
+        'Times authenticate() for a user whose password is hashed with each '
+        'configured hasher, and refused logins once failures are counted. '
+        'Logins with a hasher other than the first include the rehash.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50)
+        parser.add_argument(
+            '--hasher',
+            action='append',
+            help='Algorithm to measure, all available ones by default'
+        )
+
+    def handle(self, *args, **options):
+        hashers = get_hashers_by_algorithm()
+        algorithms = options['hasher'] or list(hashers)
+        unknown = set(algorithms).difference(hashers)
+        if unknown:
+            raise CommandError('Unknown hashers: {}'.format(
+                ', '.join(sorted(unknown))
+            ))
+
+        email = 'benchmark-login@mkznd.com'
+        password = 'benchmark-password'
+        get_user_model().objects.filter(email=email).delete()
+        user = get_user_model().objects.create_user(email=email)
+        try:
+            for algorithm in algorithms:
+                try:
+                    encoded = make_password(password, hasher=algorithm)
+                except ValueError as error:
+                    self.stdout.write(f'{algorithm}: skipped ({error})')
+                    continue
+                self.report(algorithm, options['logins'], lambda: (
+                    self.reset_password(user, encoded),
+                    authenticate(username=email, password=password)
+                ))
+
+            login_failures.reset(email, None)
+            for _ in range(login_failures.limits['email']):
+                login_failures.add(email, None)
+            self.report('refused', options['logins'], lambda: (
+                login_failures.is_blocked(email, None)
+            ))
+        finally:
+            login_failures.reset(email, None)
+            user.delete()
+
+    def reset_password(self, user, encoded):
+        """Store a hash without the rehash of a login leaking into the
+        next measurement"""
+        get_user_model().objects.filter(pk=user.pk).update(password=encoded)
+
+    def report(self, name, count, login):
+        start = time.perf_counter()
+        for _ in range(count):
+            login()
+        elapsed = time.perf_counter() - start
+        self.stdout.write('{}: {:.1f} logins/s, {:.2f} ms each'.format(
+            name, count / elapsed, elapsed / count * 1000
+        ))
@@ -0,0 +1,124 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, Q
+
+from core.models import Ingredient, Recipe
+from recipe.pantry import PantryIndex
+
+
+class Command(BaseCommand):
+    """Django command to compare pantry matching with the index and SQL"""
+
+    help = (
+        'Seeds recipes and ingredients for a benchmark user and times '
+        'matching pantries with the bitmap index and with an aggregate '
+        'query, checking both find the same recipes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=5000)
+        parser.add_argument('--per-recipe', type=int, default=8)
+        parser.add_argument('--pantry-sizes', default='50,500,2500')
+        parser.add_argument('--max-missing', type=int, default=2)
+        parser.add_argument('--repeats', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            pantry_sizes = [int(size)
+                            for size in options['pantry_sizes'].split(',')]
+        except ValueError:
+            raise CommandError(
+                '--pantry-sizes expects comma separated integers'
+            )
+        rng = random.Random(options['seed'])
+        email = 'benchmark-pantry@mkznd.com'
+        get_user_model().objects.filter(email=email).delete()
+        user = get_user_model().objects.create_user(email=email)
+        try:
+            ingredient_ids = self.seed(user, rng, options)
+
+            index = PantryIndex(user.pk)
+            start = time.perf_counter()
+            index.refresh()
+            self.stdout.write('Built index of {} recipes in {:.1f} ms'.format(
+                len(index.recipes), (time.perf_counter() - start) * 1000
+            ))
+
+            for size in pantry_sizes:
+                pantry = rng.sample(ingredient_ids, size)
+                for max_missing in (0, options['max_missing']):
+                    self.compare(
+                        f'{size} ingredients, {max_missing} missing',
+                        options['repeats'],
+                        lambda: [pk for pk, _ in index.match(
+                            pantry, max_missing
+                        )[1]],
+                        lambda: self.query(user, pantry, max_missing)
+                    )
+        finally:
+            user.delete()
+
+    def seed(self, user, rng, options):
+        """Create ingredients and recipes using random ones of them"""
+        Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Pantry {user.pk} {i}')
+            for i in range(options['ingredients'])
+        )
+        ingredient_ids = list(
+            Ingredient.objects.filter(user=user).values_list('id', flat=True)
+        )
+        count, batch_size = options['recipes'], options['batch_size']
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            Recipe.objects.bulk_create_with_relations(
+                [
+                    Recipe(
+                        user=user,
+                        title=f'Recipe {offset + i}',
+                        time_minutes=rng.randint(5, 120),
+                        price=rng.randint(100, 5000) / 100
+                    ) for i in range(size)
+                ],
+                [[] for _ in range(size)],
+                [rng.sample(ingredient_ids, options['per_recipe'])
+                 for _ in range(size)]
+            )
+        return ingredient_ids
+
+    def query(self, user, pantry, max_missing):
+        """Return the ids of the matching recipes with an aggregate query"""
+        return list(Recipe.objects.filter(user=user).annotate(
+            missing=Count('ingredients') - Count(
+                'ingredients',
+                filter=Q(ingredients__in=pantry)
+            )
+        ).filter(missing__lte=max_missing).order_by(
+            F('missing'), '-id'
+        ).values_list('id', flat=True))
+
+    def compare(self, name, repeats, match, query):
+        """Report the median time of both ways and check their results"""
+        timings = []
+        for find in (query, match):
+            durations = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                found = find()
+                durations.append(time.perf_counter() - start)
+            timings.append((statistics.median(durations), found))
+        (slow, expected), (fast, found) = timings
+        if found != expected:
+            raise CommandError(f'{name}: results differ')
+        self.stdout.write(
+            '{}: query {:.1f} ms, index {:.1f} ms, {:.1f}x, '
+            '{} recipes'.format(
+                name, slow * 1000, fast * 1000, slow / fast, len(found)
+            )
+        )
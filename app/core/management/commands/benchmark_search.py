@@ -0,0 +1,97 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import Tag, Ingredient, Recipe
+
+WORDS = (
+    'chicken', 'beef', 'tofu', 'salmon', 'rice', 'noodles', 'curry',
+    'salad', 'soup', 'stew', 'roast', 'grilled', 'spicy', 'sweet', 'sour',
+    'lemon', 'garlic', 'ginger', 'basil', 'tomato', 'potato', 'mushroom',
+    'cheese', 'chocolate', 'vanilla', 'apple', 'banana', 'berry', 'bread',
+    'pasta', 'pie', 'cake', 'pancakes', 'toast', 'beans', 'lentils',
+)
+
+
+def percentile(values, fraction):
+    """Return the value below which the fraction of sorted values fall"""
+    return values[round(fraction * (len(values) - 1))]
+
+
+class Command(BaseCommand):
+    """Django command to measure recipe search latency"""
+
+    help = 'Seeds recipes for a benchmark user and reports search latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        email = 'benchmark-search@mkznd.com'
+        get_user_model().objects.filter(email=email).delete()
+        user = get_user_model().objects.create_user(email=email)
+        try:
+            start = time.perf_counter()
+            self.seed(user, rng, options['recipes'], options['batch_size'])
+            self.stdout.write('Seeded {} recipes in {:.1f}s'.format(
+                options['recipes'], time.perf_counter() - start
+            ))
+            latencies = self.measure(user, rng, options['queries'])
+        finally:
+            user.delete()
+
+        self.stdout.write('Search latency over {} queries on {}:'.format(
+            len(latencies), connection.vendor
+        ))
+        for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            self.stdout.write('  {} {:.2f} ms'.format(
+                name, percentile(latencies, fraction) * 1000
+            ))
+
+    def seed(self, user, rng, count, batch_size):
+        """Create recipes with random titles, tags and ingredients"""
+        Tag.objects.bulk_create(Tag(user=user, name=word) for word in WORDS)
+        Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'{word} {user.pk}') for word in WORDS
+        )
+        tag_ids = list(Tag.objects.filter(
+            user=user
+        ).values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.filter(
+            user=user
+        ).values_list('id', flat=True))
+
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            Recipe.objects.bulk_create_with_relations(
+                [
+                    Recipe(
+                        user=user,
+                        title=' '.join(rng.sample(WORDS, 3)),
+                        time_minutes=rng.randint(5, 120),
+                        price=rng.randint(1, 50)
+                    ) for _ in range(size)
+                ],
+                [rng.sample(tag_ids, 2) for _ in range(size)],
+                [rng.sample(ingredient_ids, 5) for _ in range(size)]
+            )
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def measure(self, user, rng, count):
+        """Return the sorted latencies of random searches"""
+        latencies = []
+        for _ in range(count):
+            term = ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+            start = time.perf_counter()
+            list(Recipe.objects.filter(user=user).search(term)[:20])
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)
@@ -0,0 +1,118 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.management.commands.benchmark_search import WORDS
+from core.models import Tag, Ingredient, Recipe
+from core.renderers import FastJSONRenderer
+from recipe import representations
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+
+
+class Command(BaseCommand):
+    """Django command to compare the recipe list serialization paths"""
+
+    help = (
+        'Seeds recipes for a benchmark user and times rendering lists of '
+        'them with the serializers and with values() rows, checking both '
+        'give the same bytes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,1000,100000')
+        parser.add_argument('--repeats', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes expects comma separated integers')
+        rng = random.Random(options['seed'])
+        email = 'benchmark-serializers@mkznd.com'
+        get_user_model().objects.filter(email=email).delete()
+        user = get_user_model().objects.create_user(email=email)
+        try:
+            self.seed(user, rng, max(sizes), options['batch_size'])
+            queryset = Recipe.objects.defer('search_vector').filter(
+                user=user
+            ).order_by('-id')
+            for size in sizes:
+                for name, expand, serializer_class, prefetch in (
+                    ('list', (), RecipeSerializer, 'with_related_ids'),
+                    ('detail', ('tags', 'ingredients'),
+                     RecipeDetailSerializer, 'with_related'),
+                ):
+                    self.compare(
+                        f'{size} recipes, {name}',
+                        options['repeats'],
+                        lambda: JSONRenderer().render(serializer_class(
+                            getattr(queryset[:size], prefetch)(),
+                            many=True
+                        ).data),
+                        lambda: FastJSONRenderer().render(
+                            representations.represent_recipes(
+                                list(representations.values_queryset(
+                                    queryset, expand=expand
+                                )[:size]),
+                                expand=expand
+                            )
+                        )
+                    )
+        finally:
+            user.delete()
+
+    def seed(self, user, rng, count, batch_size):
+        """Create recipes with random titles, tags and ingredients"""
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=word) for word in WORDS
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'{word} {user.pk}') for word in WORDS
+        )
+        tag_ids = [tag.pk for tag in tags] if tags[0].pk else list(
+            Tag.objects.filter(user=user).values_list('id', flat=True)
+        )
+        ingredient_ids = [obj.pk for obj in ingredients] \
+            if ingredients[0].pk else list(Ingredient.objects.filter(
+                user=user
+            ).values_list('id', flat=True))
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            Recipe.objects.bulk_create_with_relations(
+                [
+                    Recipe(
+                        user=user,
+                        title=' '.join(rng.sample(WORDS, 3)),
+                        time_minutes=rng.randint(5, 120),
+                        price=rng.randint(100, 5000) / 100
+                    ) for _ in range(size)
+                ],
+                [rng.sample(tag_ids, 2) for _ in range(size)],
+                [rng.sample(ingredient_ids, 5) for _ in range(size)]
+            )
+
+    def compare(self, name, repeats, serialize, represent):
+        """Report the median time of both paths and check their output"""
+        timings = []
+        for render in (serialize, represent):
+            durations = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                content = render()
+                durations.append(time.perf_counter() - start)
+            timings.append((statistics.median(durations), content))
+        (slow, expected), (fast, content) = timings
+        if content != expected:
+            raise CommandError(f'{name}: outputs differ')
+        self.stdout.write(
+            '{}: serializers {:.1f} ms, values {:.1f} ms, {:.1f}x, '
+            '{} bytes identical'.format(
+                name, slow * 1000, fast * 1000, slow / fast, len(content)
+            )
+        )
@@ -0,0 +1,34 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ChangeLogEntry
+
+
+class Command(BaseCommand):
+    """Django command to compact the change log"""
+
+    help = (
+        'Deletes change log entries superseded by a later change of the '
+        'same object and tombstones older than the retention period. '
+        'Clients syncing from before a deleted tombstone reload their '
+        'collection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=getattr(settings, 'CHANGE_LOG_RETENTION_DAYS', 30),
+            help='Days tombstones are kept'
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        superseded, tombstones = ChangeLogEntry.objects.compact(before)
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {superseded} superseded entries and {tombstones} '
+            f'tombstones'
+        ))
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe.export import export_recipes
+
+
+class Command(BaseCommand):
+    """Django command to export the recipes of a user as NDJSON"""
+
+    help = 'Writes the recipes of a user, one JSON object per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument(
+            '--output',
+            help='File to write to, defaults to standard output'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["email"]} does not exist')
+
+        queryset = Recipe.objects.defer('search_vector').filter(
+            user=user
+        ).order_by('id')
+        lines = export_recipes(queryset, chunk_size=options['chunk_size'])
+        if options['output'] is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            output.writelines(lines)
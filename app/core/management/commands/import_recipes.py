@@ -0,0 +1,269 @@
+import csv
+import io
+import json
+import sys
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from core.models import Tag, Ingredient, Recipe, ChangeLogEntry
+from recipe.serializers import RecipeSerializer
+
+RECIPE_COLUMNS = (
+    'id', 'user_id', 'title', 'time_minutes', 'price', 'link', 'updated_at'
+)
+RECORD_FIELDS = ('title', 'time_minutes', 'price', 'link')
+
+
+def read_ndjson(lines):
+    """Yield records from lines of JSON objects"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise CommandError(f'Line {number}: {error}')
+        yield number, record
+
+
+def read_csv(lines):
+    """Yield records from CSV rows, tags and ingredients separated by |"""
+    for number, row in enumerate(csv.DictReader(lines), 2):
+        for name in ('tags', 'ingredients'):
+            row[name] = [value for value in (row.get(name) or '').split('|')
+                         if value]
+        yield number, row
+
+
+def related_names(values):
+    """Return the names from a list of names or of objects with names"""
+    if not isinstance(values, list):
+        raise ValueError('expected a list')
+    names = []
+    for value in values:
+        name = value.get('name') if isinstance(value, dict) else value
+        if not isinstance(name, str) or not name:
+            raise ValueError(f'invalid name {name!r}')
+        names.append(name)
+    return names
+
+
+def parse_record(serializer, number, record):
+    """Return the validated fields of a recipe record
+
+    The recipe fields go through the recipe serializer, so imported rows
+    follow the same rules as recipes created through the API.
+    """
+    if not isinstance(record, dict):
+        raise CommandError(f'Line {number}: invalid recipe (not an object)')
+    try:
+        fields = serializer.run_validation({
+            name: record[name] for name in RECORD_FIELDS
+            if record.get(name) is not None
+        })
+        return {
+            'link': '',
+            **fields,
+            'tags': related_names(record.get('tags', [])),
+            'ingredients': related_names(record.get('ingredients', [])),
+        }
+    except serializers.ValidationError as error:
+        messages = '; '.join(
+            '{}: {}'.format(name, ' '.join(map(str, errors)))
+            for name, errors in error.detail.items()
+        )
+        raise CommandError(f'Line {number}: invalid recipe ({messages})')
+    except ValueError as error:
+        raise CommandError(f'Line {number}: invalid recipe ({error})')
+
+
+def copy_escape(value):
+    """Escape a value for the text format of COPY"""
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+        .replace('\n', '\\n').replace('\r', '\\r')
+
+
+class Command(BaseCommand):
+    """Django command to import recipes for a user from NDJSON or CSV"""
+
+    help = (
+        'Streams recipes from an NDJSON or CSV file and inserts them in '
+        'batches, creating missing tags and ingredients by name. Each batch '
+        'is committed on its own.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('path', help='File to read, - for standard input')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Insert rows with COPY, PostgreSQL only'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["email"]} does not exist')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy requires PostgreSQL')
+
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        self.related_ids = {Tag: {}, Ingredient: {}}
+        write = self.copy_batch if options['copy'] else self.insert_batch
+
+        source = sys.stdin if path == '-' else \
+            open(path, encoding='utf-8', newline='')
+        try:
+            reader = read_csv if file_format == 'csv' else read_ndjson
+            serializer = RecipeSerializer(context={'fields': RECORD_FIELDS})
+            records = (parse_record(serializer, number, record)
+                       for number, record in reader(source))
+            total = 0
+            while True:
+                batch = list(islice(records, options['batch_size']))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    tag_ids = self.resolve(Tag, batch, 'tags')
+                    ingredient_ids = self.resolve(
+                        Ingredient, batch, 'ingredients'
+                    )
+                    write(batch, tag_ids, ingredient_ids)
+                total += len(batch)
+                self.stdout.write(f'Imported {total} recipes')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {total} recipes'))
+
+    def resolve(self, model, batch, name):
+        """Return the ids of the related names of each record
+
+        Names are looked up once and remembered, missing ones are created
+        with a bulk insert.
+        """
+        known = self.related_ids[model]
+        missing = {value for record in batch for value in record[name]
+                   if value not in known}
+        if missing:
+            self.load(model, missing)
+            created = [value for value in missing if value not in known]
+            self.check_taken(model, created)
+            model.objects.bulk_create(
+                [model(user=self.user, name=value) for value in created],
+                ignore_conflicts=True
+            )
+            self.load(model, missing)
+            ChangeLogEntry.objects.record(
+                self.user.pk,
+                model._meta.model_name,
+                [known[value] for value in created if value in known]
+            )
+            unresolved = missing.difference(known)
+            if unresolved:
+                raise CommandError('Could not create {} named {}'.format(
+                    model._meta.verbose_name_plural,
+                    ', '.join(sorted(unresolved))
+                ))
+        return [list(dict.fromkeys(known[value] for value in record[name]))
+                for record in batch]
+
+    def check_taken(self, model, names):
+        """Fail before writing when names unique across users already
+        belong to other users"""
+        if not model._meta.get_field('name').unique:
+            return
+        taken = model.objects.filter(name__in=names).exclude(
+            user=self.user
+        ).values_list('name', flat=True)
+        if taken:
+            raise CommandError(
+                '{} names are unique across users and {} already belong to '
+                'other users'.format(
+                    model._meta.verbose_name.capitalize(),
+                    ', '.join(sorted(taken))
+                )
+            )
+
+    def load(self, model, names):
+        """Remember the ids of existing rows with the names"""
+        rows = model.objects.filter(
+            user=self.user,
+            name__in=names
+        ).values_list('name', 'id')
+        for name, pk in rows:
+            self.related_ids[model].setdefault(name, pk)
+
+    def insert_batch(self, batch, tag_ids, ingredient_ids):
+        """Insert a batch of recipes with bulk inserts"""
+        Recipe.objects.bulk_create_with_relations(
+            [
+                Recipe(
+                    user=self.user,
+                    title=record['title'],
+                    time_minutes=record['time_minutes'],
+                    price=record['price'],
+                    link=record['link']
+                )
+                for record in batch
+            ],
+            tag_ids,
+            ingredient_ids
+        )
+
+    def copy_batch(self, batch, tag_ids, ingredient_ids):
+        """Insert a batch of recipes with COPY, reserving their ids first"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence('core_recipe', 'id')) "
+                "FROM generate_series(1, %s)",
+                [len(batch)]
+            )
+            recipe_ids = [row[0] for row in cursor.fetchall()]
+            now = timezone.now()
+            self.copy(cursor, Recipe._meta.db_table, RECIPE_COLUMNS, (
+                (pk, self.user.pk, record['title'], record['time_minutes'],
+                 record['price'], record['link'], now)
+                for pk, record in zip(recipe_ids, batch)
+            ))
+            for relation, related_ids in (('tags', tag_ids),
+                                          ('ingredients', ingredient_ids)):
+                field = Recipe._meta.get_field(relation)
+                self.copy(
+                    cursor,
+                    field.remote_field.through._meta.db_table,
+                    (field.m2m_column_name(), field.m2m_reverse_name()),
+                    ((pk, related_id)
+                     for pk, ids in zip(recipe_ids, related_ids)
+                     for related_id in ids)
+                )
+        Recipe.objects.filter(pk__in=recipe_ids).update_search_vectors()
+        ChangeLogEntry.objects.record(self.user.pk, 'recipe', recipe_ids)
+
+    def copy(self, cursor, table, columns, rows):
+        """Load rows into a table with COPY FROM STDIN"""
+        data = io.StringIO()
+        for row in rows:
+            data.write('\t'.join(copy_escape(value) for value in row))
+            data.write('\n')
+        data.seek(0)
+        cursor.copy_expert(
+            'COPY {} ({}) FROM STDIN'.format(
+                connection.ops.quote_name(table),
+                ', '.join(connection.ops.quote_name(c) for c in columns)
+            ),
+            data
+        )
@@ -0,0 +1,79 @@
+import csv
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.import_recipes import read_ndjson
+
+USER_FIELDS = ('email', 'password', 'name')
+
+
+def parse_record(number, record):
+    """Return the fields of a user record"""
+    if not isinstance(record, dict) or not record.get('email'):
+        raise CommandError(f'Line {number}: a user needs an email')
+    return {name: record[name] for name in USER_FIELDS
+            if record.get(name) is not None}
+
+
+class Command(BaseCommand):
+    """Django command to create users in bulk from NDJSON or CSV"""
+
+    help = (
+        'Creates users from an NDJSON or CSV file with email, password and '
+        'name, hashing passwords in a process pool and inserting each batch '
+        'with one query. Existing emails are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read, - for standard input')
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--processes',
+            type=int,
+            help='Processes hashing passwords, one per CPU by default'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        source = sys.stdin if path == '-' else \
+            open(path, encoding='utf-8', newline='')
+        try:
+            if file_format == 'csv':
+                rows = enumerate(csv.DictReader(source), 2)
+            else:
+                rows = read_ndjson(source)
+            records = (parse_record(number, record)
+                       for number, record in rows)
+
+            created = skipped = 0
+            with ProcessPoolExecutor(
+                options['processes'],
+                initializer=django.setup
+            ) as executor:
+                while True:
+                    batch = list(islice(records, options['batch_size']))
+                    if not batch:
+                        break
+                    users = get_user_model().objects.bulk_create_users(
+                        batch,
+                        executor=executor
+                    )
+                    created += len(users)
+                    skipped += len(batch) - len(users)
+                    self.stdout.write(f'Created {created} users')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} users, skipped {skipped} existing'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipe.mixins import response_cache
+
+
+class Command(BaseCommand):
+    """Django command to report the hit rate of the response cache"""
+
+    help = (
+        'Prints the hits and misses of the list response cache counted by '
+        'all processes sharing it, and optionally resets them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them'
+        )
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        rate = stats['hits'] / lookups if lookups else 0
+        self.stdout.write(
+            f'Hits: {stats["hits"]}, misses: {stats["misses"]}, '
+            f'hit rate: {rate:.1%}'
+        )
+        if options['reset']:
+            response_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Reset the counters'))
@@ -1,20 +1,110 @@
+import random
 import time
-from django.db import connections
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, DEFAULT_DB_ALIAS
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """Django command to pause exceptions until database is available"""
 
+    help = (
+        'Connects to the database and runs SELECT 1 until it succeeds, '
+        'backing off exponentially with jitter between attempts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Wait for every configured database in parallel'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60,
+            help='Seconds to wait before giving up'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.5,
+            help='Seconds to wait after the first failure, doubled after '
+                 'each further one'
+        )
+        parser.add_argument('--max-interval', type=float, default=5)
+
     def handle(self, *args, **options):
+        aliases = list(connections) if options['all'] \
+            else [options['database']]
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
-            try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database connection is not available,'
-                                  ' waiting...')
-                time.sleep(0.5)
-        self.stdout.write(self.style.SUCCESS('Database is available!'))
+        start = time.monotonic()
+
+        def wait(alias):
+            return self.wait(
+                alias,
+                start + options['timeout'],
+                options['interval'],
+                options['max_interval']
+            )
+
+        if len(aliases) == 1:
+            available = [wait(aliases[0])]
+        else:
+            with ThreadPoolExecutor(len(aliases)) as executor:
+                available = list(executor.map(wait, aliases))
+
+        unavailable = [alias for alias, ok in zip(aliases, available)
+                       if not ok]
+        if unavailable:
+            raise CommandError('Database {} not available after {}s'.format(
+                ', '.join(unavailable), options['timeout']
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            'Database is available! Waited {:.2f}s'.format(
+                time.monotonic() - start
+            )
+        ))
+
+    def wait(self, alias, deadline, interval, max_interval):
+        """Return whether a database answered a query before the deadline"""
+        connection = connections[alias]
+        start = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                try:
+                    connection.ensure_connection()
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                except OperationalError as error:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    backoff = min(max_interval, interval * 2 ** (attempt - 1))
+                    delay = min(
+                        remaining,
+                        backoff / 2 + random.uniform(0, backoff / 2)
+                    )
+                    self.stdout.write(
+                        'Database {} is not available ({}), waiting '
+                        '{:.2f}s...'.format(alias, error, delay)
+                    )
+                    time.sleep(delay)
+                else:
+                    self.stdout.write(
+                        'Database {} answered after {} attempts in '
+                        '{:.2f}s'.format(
+                            alias, attempt, time.monotonic() - start
+                        )
+                    )
+                    return True
+        finally:
+            # Connections are per thread, so ones opened by the workers of
+            # --all would otherwise stay open
+            if not connection.in_atomic_block:
+                connection.close()
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from core.db.routers import track_writes, use_replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def get_client_key(request):
+    """Return a cache key identifying the client of a request"""
+    identity = request.META.get('HTTP_AUTHORIZATION') or \
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME) or \
+        request.META.get('REMOTE_ADDR', '')
+    return 'replica-pin:' + hashlib.sha256(identity.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """Serve safe requests from the read replicas
+
+    A client whose request wrote to the database and succeeded is pinned
+    to the primary for REPLICA_STICKY_SECONDS, so it reads its own writes
+    while the replicas catch up. Clients are told apart by their
+    Authorization header, session or address. The pins are kept in the
+    REPLICA_PIN_CACHE_ALIAS cache, and without one every request reads
+    from the primary. Async views are awaited without leaving the event
+    loop, only the pin cache is used from a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function for Django
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def get_pin_cache(self):
+        """Return the cache keeping the pins or None"""
+        alias = getattr(settings, 'REPLICA_PIN_CACHE_ALIAS', None)
+        return None if alias is None else caches[alias]
+
+    def should_pin(self, writes, response):
+        """Return whether a request with the writes and response pins its
+        client to the primary"""
+        return writes.get('wrote', False) and response.status_code < 400
+
+    def pin(self, cache, key):
+        cache.set(key, True, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        cache = self.get_pin_cache()
+        if cache is None:
+            return self.get_response(request)
+        key = get_client_key(request)
+
+        if request.method not in SAFE_METHODS:
+            with track_writes() as writes:
+                response = self.get_response(request)
+            if self.should_pin(writes, response):
+                self.pin(cache, key)
+            return response
+
+        if cache.get(key):
+            return self.get_response(request)
+        with use_replicas():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        cache = self.get_pin_cache()
+        if cache is None:
+            return await self.get_response(request)
+        key = get_client_key(request)
+
+        if request.method not in SAFE_METHODS:
+            with track_writes() as writes:
+                response = await self.get_response(request)
+            if self.should_pin(writes, response):
+                await sync_to_async(self.pin, thread_sensitive=False)(
+                    cache, key
+                )
+            return response
+
+        if await sync_to_async(cache.get, thread_sensitive=False)(key):
+            return await self.get_response(request)
+        with use_replicas():
+            return await self.get_response(request)
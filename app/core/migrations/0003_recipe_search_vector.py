@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:44
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# Copied from core.search as of this migration, so later changes to it
+# don't change what this migration does
+SEARCH_CONFIG = 'english'
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """Adds an index on PostgreSQL only, other databases search without it"""
+
+    def database_forwards(self, app_label, schema_editor, *args):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, *args)
+
+    def database_backwards(self, app_label, schema_editor, *args):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, *args)
+
+
+def related_names(Recipe, relation):
+    field = Recipe._meta.get_field(relation)
+    return Subquery(field.related_model.objects.filter(**{
+        field.related_query_name(): OuterRef('pk')
+    }).values(field.related_query_name()).annotate(
+        names=StringAgg('name', ' ')
+    ).values('names'))
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.using(schema_editor.connection.alias).update(
+        search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+            SearchVector(related_names(Recipe, 'tags'), weight='B',
+                         config=SEARCH_CONFIG) +
+            SearchVector(related_names(Recipe, 'ingredients'), weight='C',
+                         config=SEARCH_CONFIG)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        AddPostgresIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
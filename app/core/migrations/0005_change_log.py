@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 05:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def compact_existing_collections(apps, schema_editor):
+    """Make clients of existing collections reload them, as their
+    changes weren't logged"""
+    CollectionVersion = apps.get_model('core', 'CollectionVersion')
+    CollectionVersion.objects.using(schema_editor.connection.alias).update(
+        compacted_seq=models.F('version')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_collection_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionversion',
+            name='compacted_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            compact_existing_collections,
+            migrations.RunPython.noop
+        ),
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('model_name', models.CharField(choices=[('tag', 'tag'), ('ingredient', 'ingredient'), ('recipe', 'recipe')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['user', 'model_name', 'object_id', 'seq'], name='changelog_object_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='changelogentry',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='changelog_user_seq_uniq'),
+        ),
+    ]
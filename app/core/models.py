@@ -1,10 +1,51 @@
-from django.db import models
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import models, connections, transaction
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core import search
+
+# Users being deleted in this thread, whose collections go with them
+_deleting_users = threading.local()
+
+
+@contextmanager
+def deleting_users(user_ids):
+    """Mark users as being deleted in this thread while the block runs,
+    whether it completes or raises"""
+    previous = getattr(_deleting_users, 'ids', frozenset())
+    _deleting_users.ids = previous.union(user_ids)
+    try:
+        yield
+    finally:
+        _deleting_users.ids = previous
+
+
+def is_deleting_user(user_id):
+    """Return whether the rows of a user are being deleted with it"""
+    return user_id in getattr(_deleting_users, 'ids', ())
+
+
+class UserQuerySet(models.QuerySet):
 
+    def delete(self):
+        """Deletes the users, marking them as being deleted meanwhile"""
+        with deleting_users(self.values_list('pk', flat=True)):
+            return super().delete()
 
-class UserManager(BaseUserManager):
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
 
     def create_user(self, email, password=None, **extra_fields):
         """Creates, saves and returns a new user using email and [password]"""
@@ -17,12 +58,45 @@ class UserManager(BaseUserManager):
 
     def create_superuser(self, email, password):
         """Creates superuser with is_superuser and is_staff checked"""
-        user = self.create_user(email, password)
-        user.is_superuser = True
-        user.is_staff = True
+        return self.create_user(
+            email,
+            password,
+            is_superuser=True,
+            is_staff=True
+        )
 
-        user.save(using=self._db)
-        return user
+    def bulk_create_users(self, records, executor=None):
+        """Creates users from dicts of an email, a password and other fields
+        with one insert and returns them
+
+        Passwords are hashed with the map of an executor if one is given,
+        such as a process pool. Records with an email already taken are
+        skipped.
+        """
+        records = [
+            {**record, 'email': self.normalize_email(record['email'])}
+            for record in records
+        ]
+        taken = set(self.filter(
+            email__in=[record['email'] for record in records]
+        ).values_list('email', flat=True))
+        unique = []
+        for record in records:
+            if record['email'] not in taken:
+                taken.add(record['email'])
+                unique.append(record)
+
+        hash_map = executor.map if executor is not None else map
+        passwords = hash_map(
+            make_password,
+            [record.get('password') for record in unique]
+        )
+        users = []
+        for record, password in zip(unique, passwords):
+            fields = {key: value for key, value in record.items()
+                      if key != 'password'}
+            users.append(self.model(password=password, **fields))
+        return self.bulk_create(users)
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -36,6 +110,11 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+    def delete(self, *args, **kwargs):
+        """Deletes the user, marking it as being deleted meanwhile"""
+        with deleting_users([self.pk]):
+            return super().delete(*args, **kwargs)
+
 
 class Tag(models.Model):
     """Tag to be used for a recipe"""
@@ -44,6 +123,15 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'name', 'id'],
+                name='tag_user_name_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -56,11 +144,233 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'name', 'id'],
+                name='ingredient_user_name_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related_ids(self, relations=('tags', 'ingredients')):
+        """Prefetches only the ids of related tags and ingredients"""
+        return self.prefetch_related(*(
+            models.Prefetch(
+                relation,
+                queryset=self.model._meta.get_field(
+                    relation
+                ).related_model.objects.only('id').order_by('id')
+            )
+            for relation in relations
+        ))
+
+    def with_related(self, relations=('tags', 'ingredients')):
+        """Prefetches full related tag and ingredient rows"""
+        return self.prefetch_related(*(
+            models.Prefetch(
+                relation,
+                queryset=self.model._meta.get_field(
+                    relation
+                ).related_model.objects.order_by('id')
+            )
+            for relation in relations
+        ))
+
+    def with_related_id_arrays(self, relations=('tags', 'ingredients')):
+        """Annotates the sorted ids of related rows as <relation>_ids
+        arrays, PostgreSQL only"""
+        annotations = {}
+        for relation in relations:
+            field = self.model._meta.get_field(relation)
+            related = field.m2m_reverse_name()
+            ids = field.remote_field.through.objects.filter(**{
+                field.m2m_column_name(): models.OuterRef('pk')
+            }).values(field.m2m_column_name()).annotate(
+                ids=ArrayAgg(related, ordering=related)
+            ).values('ids')
+            annotations[f'{relation}_ids'] = Coalesce(
+                models.Subquery(ids),
+                models.Value([]),
+                output_field=ArrayField(models.BigIntegerField())
+            )
+        return self.annotate(**annotations)
+
+    def with_any_related(self, relation, ids):
+        """Filters recipes linked to any of the ids through a relation"""
+        field = self.model._meta.get_field(relation)
+        linked = field.remote_field.through.objects.filter(**{
+            field.m2m_field_name(): models.OuterRef('pk'),
+            f'{field.m2m_reverse_field_name()}__in': ids
+        })
+        return self.filter(models.Exists(linked))
+
+    def with_all_related(self, relation, ids):
+        """Filters recipes linked to all of the ids through a relation"""
+        field = self.model._meta.get_field(relation)
+        recipe = field.m2m_field_name()
+        related = field.m2m_reverse_field_name()
+        linked = field.remote_field.through.objects.filter(**{
+            f'{related}__in': ids
+        }).values(recipe).annotate(
+            matched=models.Count(related)
+        ).filter(matched=len(set(ids))).values(recipe)
+        return self.filter(pk__in=linked)
+
+    def link_related(self, relation, related_ids):
+        """Links recipes to related ids with a single bulk insert
+
+        related_ids maps recipe ids to the ids to link them with, links
+        that already exist are left alone.
+        """
+        field = self.model._meta.get_field(relation)
+        through = field.remote_field.through
+        recipe = f'{field.m2m_field_name()}_id'
+        related = f'{field.m2m_reverse_field_name()}_id'
+        through.objects.using(self.db).bulk_create([
+            through(**{recipe: recipe_id, related: related_id})
+            for recipe_id, ids in related_ids.items()
+            for related_id in ids
+        ], ignore_conflicts=True)
+
+    def unlink_related(self, relation, related_ids):
+        """Unlinks recipes from related ids with a single delete
+
+        related_ids maps recipe ids to the ids to unlink them from.
+        """
+        field = self.model._meta.get_field(relation)
+        recipe = field.m2m_field_name()
+        related = field.m2m_reverse_field_name()
+        grouped = defaultdict(list)
+        for recipe_id, ids in related_ids.items():
+            if ids:
+                grouped[frozenset(ids)].append(recipe_id)
+        condition = models.Q()
+        for ids, recipe_ids in grouped.items():
+            condition |= models.Q(**{
+                f'{recipe}__in': recipe_ids,
+                f'{related}__in': list(ids)
+            })
+        if not condition:
+            return 0
+        deleted, _ = field.remote_field.through.objects.using(
+            self.db
+        ).filter(condition).delete()
+        return deleted
+
+    def add_related(self, relation, ids):
+        """Links every recipe to the related ids, leaving existing links
+        alone, and returns the ids of the recipes"""
+        return self.change_related(self.link_related, relation, ids)
+
+    def remove_related(self, relation, ids):
+        """Unlinks every recipe from the related ids and returns the ids
+        of the recipes"""
+        return self.change_related(self.unlink_related, relation, ids)
+
+    def change_related(self, change, relation, ids):
+        """Applies a link or unlink to every recipe with one bulk query,
+        touching the recipes as saving them would"""
+        with transaction.atomic(using=self.db):
+            recipes = list(self.only('user_id'))
+            recipe_ids = [recipe.pk for recipe in recipes]
+            if not recipe_ids:
+                return recipe_ids
+            change(relation, {pk: ids for pk in recipe_ids})
+            queryset = self.model.objects.using(self.db).filter(
+                pk__in=recipe_ids
+            )
+            queryset.update(updated_at=timezone.now())
+            queryset.update_search_vectors()
+            ChangeLogEntry.objects.using(self.db).record_objects(recipes)
+        return recipe_ids
+
+    def set_related(self, relation, related_ids):
+        """Replaces the related ids of recipes with bulk queries"""
+        field = self.model._meta.get_field(relation)
+        field.remote_field.through.objects.using(self.db).filter(**{
+            f'{field.m2m_field_name()}__in': list(related_ids)
+        }).delete()
+        self.link_related(relation, related_ids)
+
+    def bulk_create_with_relations(self, recipes, tag_ids, ingredient_ids):
+        """Inserts recipes and their relations with bulk queries
+
+        tag_ids and ingredient_ids hold the related ids of each recipe,
+        in the order of the recipes.
+        """
+        with transaction.atomic(using=self.db):
+            recipes = self.insert_rows(recipes)
+            recipe_ids = [recipe.pk for recipe in recipes]
+            self.link_related('tags', dict(zip(recipe_ids, tag_ids)))
+            self.link_related(
+                'ingredients',
+                dict(zip(recipe_ids, ingredient_ids))
+            )
+            self.filter(pk__in=recipe_ids).update_search_vectors()
+            ChangeLogEntry.objects.using(self.db).record_objects(recipes)
+        return recipes
+
+    def insert_rows(self, recipes):
+        """Inserts recipes with bulk_create and sets their ids
+
+        Backends that can't return the ids of a bulk insert, such as
+        SQLite, hold a write lock on the database until the transaction
+        ends and number rows in insertion order, so the ids of the batch
+        are read back as the highest ones.
+        """
+        with transaction.atomic(using=self.db):
+            recipes = self.bulk_create(recipes)
+            if recipes and recipes[0].pk is None:
+                recipe_ids = list(self.order_by('-pk').values_list(
+                    'pk', flat=True
+                )[:len(recipes)])
+                for recipe, pk in zip(recipes, recipe_ids[::-1]):
+                    recipe.pk = pk
+        return recipes
+
+    def bulk_update_with_relations(self, recipes, fields, tag_ids,
+                                   ingredient_ids):
+        """Updates recipes and replaces their relations with bulk queries
+
+        tag_ids and ingredient_ids map the ids of recipes whose relations
+        change to their new related ids.
+        """
+        with transaction.atomic(using=self.db):
+            # bulk_update() skips auto_now, which cursors, ETags and the
+            # change feed rely on
+            now = timezone.now()
+            for recipe in recipes:
+                recipe.updated_at = now
+            self.bulk_update(recipes, [*fields, 'updated_at'])
+            self.set_related('tags', tag_ids)
+            self.set_related('ingredients', ingredient_ids)
+            self.filter(
+                pk__in=[recipe.pk for recipe in recipes]
+            ).update_search_vectors()
+            ChangeLogEntry.objects.using(self.db).record_objects(recipes)
+        return recipes
+
+    def search(self, term):
+        """Filters recipes matching a search term, best matches first"""
+        if connections[self.db].vendor == 'postgresql':
+            return search.search(self, term)
+        return search.search_fallback(self, term)
+
+    def update_search_vectors(self):
+        """Recomputes the search vector of the recipes"""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=search.search_vector(self.model))
+
+
 class Recipe(models.Model):
     """Recipe object"""
     user = models.ForeignKey(
@@ -73,6 +383,178 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
+    updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class CollectionVersion(models.Model):
+    """Version of the tags, ingredients and recipes of a user
+
+    The version is bumped on every write to the collection, so it can
+    tell whether anything changed without reading the collection itself.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    compacted_seq = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def bump(cls, user_id, count=1):
+        """Increments the version of the collection of a user and returns
+        the new version
+
+        The row stays locked until the transaction ends, so versions are
+        committed in order.
+        """
+        with transaction.atomic():
+            updated = cls.objects.filter(user_id=user_id).update(
+                version=models.F('version') + count,
+                updated_at=timezone.now()
+            )
+            if not updated:
+                _, created = cls.objects.get_or_create(
+                    user_id=user_id,
+                    defaults={'version': count}
+                )
+                if not created:
+                    return cls.bump(user_id, count)
+            return cls.objects.filter(user_id=user_id).values_list(
+                'version', flat=True
+            ).get()
+
+    @classmethod
+    def current(cls, user_id):
+        """Returns the version of the collection of a user and the time
+        it was last changed"""
+        state = cls.objects.filter(user_id=user_id).values_list(
+            'version', 'updated_at'
+        ).first()
+        return state or (0, None)
+
+
+class ChangeLogQuerySet(models.QuerySet):
+
+    def record(self, user_id, model_name, object_ids, deleted=False):
+        """Logs changes to objects of a user with one insert, numbering
+        them with the versions their collection is bumped to"""
+        object_ids = list(object_ids)
+        if not object_ids:
+            return []
+        with transaction.atomic(using=self.db):
+            version = CollectionVersion.bump(user_id, len(object_ids))
+            first = version - len(object_ids) + 1
+            return self.bulk_create([
+                self.model(
+                    user_id=user_id,
+                    seq=first + offset,
+                    model_name=model_name,
+                    object_id=object_id,
+                    deleted=deleted
+                )
+                for offset, object_id in enumerate(object_ids)
+            ])
+
+    def record_objects(self, objects, deleted=False):
+        """Logs changes to model instances, grouped by their owners"""
+        grouped = defaultdict(list)
+        for obj in objects:
+            grouped[(obj.user_id, obj._meta.model_name)].append(obj.pk)
+        for (user_id, model_name), object_ids in grouped.items():
+            self.record(user_id, model_name, object_ids, deleted)
+
+    def compact(self, tombstones_before):
+        """Deletes entries superseded by a later entry for the same object
+        and tombstones logged before a time, returning how many of each
+        were deleted
+
+        Clients syncing from before a deleted tombstone can't see the
+        deletion anymore, so the compacted sequence number of its user is
+        raised to it. Each user is compacted in one transaction holding the
+        lock on its collection version, so no change is logged for it
+        meanwhile and both deletions commit together.
+        """
+        superseded = removed = 0
+        user_ids = list(self.order_by('user').values_list(
+            'user', flat=True
+        ).distinct())
+        for user_id in user_ids:
+            with transaction.atomic(using=self.db):
+                locked = CollectionVersion.objects.using(self.db) \
+                    .select_for_update().filter(user_id=user_id) \
+                    .values_list('version', flat=True).first()
+                if locked is None:
+                    continue
+                entries = self.filter(user_id=user_id)
+                later = self.model.objects.filter(
+                    user=models.OuterRef('user'),
+                    model_name=models.OuterRef('model_name'),
+                    object_id=models.OuterRef('object_id'),
+                    seq__gt=models.OuterRef('seq')
+                )
+                superseded += entries.filter(models.Exists(later)).delete()[0]
+
+                tombstones = entries.filter(
+                    deleted=True,
+                    created_at__lt=tombstones_before
+                )
+                seq = tombstones.aggregate(last=models.Max('seq'))['last']
+                if seq is not None:
+                    CollectionVersion.objects.using(self.db).filter(
+                        user_id=user_id,
+                        compacted_seq__lt=seq
+                    ).update(compacted_seq=seq)
+                    removed += tombstones.delete()[0]
+        return superseded, removed
+
+
+class ChangeLogEntry(models.Model):
+    """Change to an object in the collection of a user
+
+    Entries are numbered with the collection version, so they are ordered
+    for each user, and deletions are kept as tombstones until compacted.
+    """
+    MODEL_NAMES = ('tag', 'ingredient', 'recipe')
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    seq = models.PositiveBigIntegerField()
+    model_name = models.CharField(
+        max_length=20,
+        choices=[(name, name) for name in MODEL_NAMES]
+    )
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeLogQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'seq'],
+                name='changelog_user_seq_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'model_name', 'object_id', 'seq'],
+                name='changelog_object_idx'
+            ),
+        ]
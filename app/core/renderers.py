@@ -0,0 +1,31 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON renderer encoding with orjson when it is installed
+
+    Compact responses are byte for byte those of JSONRenderer. Indented ones
+    and data orjson can't encode fall back to it.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by JSONRenderer to keep the output valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028') \
+            .replace(b'\xe2\x80\xa9', b'\\u2029')
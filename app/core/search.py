@@ -0,0 +1,81 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    SearchVector
+from django.db.models import BigIntegerField, Exists, ExpressionWrapper, \
+    F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'english'
+
+# Ranks are rounded to buckets of this size, so they stay exact integers
+# in pagination cursors
+RANK_PRECISION = 10 ** 6
+
+
+def related_names(recipe_model, relation):
+    """Return a subquery joining the names related to a recipe"""
+    field = recipe_model._meta.get_field(relation)
+    names = field.related_model.objects.filter(**{
+        field.related_query_name(): OuterRef('pk')
+    }).values(field.related_query_name()).annotate(
+        names=StringAgg('name', ' ')
+    ).values('names')
+    return Subquery(names)
+
+
+def search_vector(recipe_model):
+    """Return the expression computing the search vector of recipes
+
+    Titles weigh more than tag names, which weigh more than ingredient
+    names.
+    """
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+        SearchVector(
+            related_names(recipe_model, 'tags'),
+            weight='B',
+            config=SEARCH_CONFIG
+        ) +
+        SearchVector(
+            related_names(recipe_model, 'ingredients'),
+            weight='C',
+            config=SEARCH_CONFIG
+        )
+    )
+
+
+def search(queryset, term):
+    """Return the recipes matching a search term, best matches first
+
+    Matches are ordered by their rank rounded to RANK_PRECISION, then by
+    id, so keyset cursors hold exact values.
+    """
+    query = SearchQuery(term, config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(
+            ExpressionWrapper(
+                SearchRank(F('search_vector'), query) * RANK_PRECISION,
+                output_field=FloatField()
+            ),
+            output_field=BigIntegerField()
+        )
+    ).order_by('-rank', '-id')
+
+
+def search_fallback(queryset, term):
+    """Return the recipes containing every word of a search term
+
+    Used on databases without full-text search, such as SQLite in tests.
+    """
+    model = queryset.model
+    condition = Q()
+    for word in term.split():
+        word_condition = Q(title__icontains=word)
+        for relation in ('tags', 'ingredients'):
+            field = model._meta.get_field(relation)
+            word_condition |= Exists(field.related_model.objects.filter(**{
+                field.related_query_name(): OuterRef('pk'),
+                'name__icontains': word
+            }))
+        condition &= word_condition
+    return queryset.filter(condition).order_by('-id')
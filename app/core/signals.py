@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.models import Tag, Ingredient, Recipe, ChangeLogEntry, \
+    is_deleting_user
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, **kwargs):
+    """Recompute the search vector of a saved recipe"""
+    Recipe.objects.filter(pk=instance.pk).update_search_vectors()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_linked_search_vectors(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """Recompute the search vectors of recipes whose relations changed"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Recipe.objects.filter(pk=instance.pk).update_search_vectors()
+        return
+    if action == 'pre_clear':
+        instance._search_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        recipe_ids = getattr(instance, '_search_recipe_ids', [])
+        Recipe.objects.filter(pk__in=recipe_ids).update_search_vectors()
+    elif action in ('post_add', 'post_remove'):
+        Recipe.objects.filter(pk__in=pk_set).update_search_vectors()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_renamed_search_vectors(sender, instance, created, **kwargs):
+    """Recompute the search vectors of recipes linked to a renamed row"""
+    if not created:
+        instance.recipe_set.all().update_search_vectors()
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def collect_deleted_recipe_ids(sender, instance, **kwargs):
+    """Remember the recipes linked to a row before it is deleted"""
+    instance._search_recipe_ids = list(
+        instance.recipe_set.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_deleted_search_vectors(sender, instance, **kwargs):
+    """Recompute the search vectors of recipes linked to a deleted row"""
+    recipe_ids = getattr(instance, '_search_recipe_ids', [])
+    Recipe.objects.filter(pk__in=recipe_ids).update_search_vectors()
+
+
+@receiver(post_delete, sender=Token)
+def uncache_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a deleted token"""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def uncache_saved_user_tokens(sender, instance, created, **kwargs):
+    """Drop cached tokens of a saved user, e.g. after a password change
+    or a deactivation"""
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True):
+        token_cache.delete(key)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+def log_saved_change(sender, instance, **kwargs):
+    """Log the change of a written row in the collection of its owner"""
+    ChangeLogEntry.objects.record_objects([instance])
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def log_deleted_change(sender, instance, **kwargs):
+    """Log a tombstone for a deleted row in the collection of its owner"""
+    if not is_deleting_user(instance.user_id):
+        ChangeLogEntry.objects.record_objects([instance], deleted=True)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def log_unlinked_changes(sender, instance, **kwargs):
+    """Log the change of recipes linked to a deleted row"""
+    if not is_deleting_user(instance.user_id):
+        recipe_ids = getattr(instance, '_search_recipe_ids', [])
+        ChangeLogEntry.objects.record_objects(
+            Recipe.objects.filter(pk__in=recipe_ids).only('user_id')
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def log_linked_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Log the change of recipes whose relations changed"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ChangeLogEntry.objects.record_objects([instance])
+        return
+    if action == 'post_clear':
+        recipe_ids = getattr(instance, '_search_recipe_ids', [])
+    else:
+        recipe_ids = pk_set
+    ChangeLogEntry.objects.record_objects(
+        Recipe.objects.filter(pk__in=recipe_ids).only('user_id')
+    )
@@ -0,0 +1,136 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.authentication import CachedTokenAuthentication, TokenCache, \
+    token_cache
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_cached_token_skips_database(self):
+        """Test that a cached token is authenticated without queries"""
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            cached_user, token = self.auth.authenticate_credentials(
+                self.token.key
+            )
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(cached_user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_deleted_token_invalidated(self):
+        """Test that a deleted token stops authenticating"""
+        self.auth.authenticate_credentials(self.token.key)
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deactivated_user_invalidated(self):
+        """Test that the token of a deactivated user stops authenticating"""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_password_change_invalidated(self):
+        """Test that changing the password drops the cached user"""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.set_password('new_password')
+        self.user.save()
+
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertTrue(user.check_password('new_password'))
+
+
+class TokenCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.addCleanup(caches['default'].clear)
+
+    def test_entries_expire(self):
+        """Test that entries are dropped after the timeout"""
+        cache = TokenCache(timeout=10, max_size=10)
+        with patch('time.monotonic', return_value=100):
+            cache.set('key', self.user)
+        with patch('time.monotonic', return_value=109):
+            self.assertEqual(cache.get('key'), self.user)
+        with patch('time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_evicted(self):
+        """Test that the least recently used entry is evicted"""
+        cache = TokenCache(timeout=10, max_size=2)
+        cache.set('first', self.user)
+        cache.set('second', self.user)
+        cache.get('first')
+        cache.set('third', self.user)
+
+        self.assertEqual(cache.get('first'), self.user)
+        self.assertIsNone(cache.get('second'))
+        self.assertEqual(cache.get('third'), self.user)
+
+    def test_shared_cache(self):
+        """Test that entries are shared through the Django cache"""
+        writer = TokenCache(timeout=10, max_size=10, alias='default')
+        reader = TokenCache(timeout=10, max_size=10, alias='default')
+        writer.set('key', self.user)
+
+        self.assertEqual(reader.get('key'), self.user)
+
+    def test_shared_cache_revocation(self):
+        """Test that deleting a shared entry revokes it in every process"""
+        writer = TokenCache(timeout=10, max_size=10, alias='default')
+        reader = TokenCache(timeout=10, max_size=10, alias='default')
+        writer.set('key', self.user)
+        reader.get('key')
+
+        writer.delete('key')
+
+        self.assertIsNone(reader.get('key'))
+
+    def test_shared_cache_stores_fields(self):
+        """Test that user fields but no password hashes are cached"""
+        cache = TokenCache(timeout=10, max_size=10, alias='default')
+        cache.set('key', self.user)
+
+        entry = caches['default'].get(TokenCache.key_prefix + 'key')
+
+        self.assertEqual(entry['id'], self.user.pk)
+        self.assertEqual(entry['email'], 'test@mkznd.com')
+        self.assertNotIn('password', entry)
+
+    def test_cached_user_loads_fields(self):
+        """Test that a cached user needs no query but for its password"""
+        cache = TokenCache(timeout=10, max_size=10)
+        cache.set('key', self.user)
+
+        user = cache.get('key')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(user.email, 'test@mkznd.com')
+            self.assertFalse(user.is_staff)
+        self.assertTrue(user.check_password('password'))
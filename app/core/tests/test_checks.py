@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_replica_pin_cache
+
+REPLICAS = ['replica1']
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': 'memcached:11211',
+    },
+}
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS, CACHES=SHARED_CACHES)
+class ReplicaPinCacheCheckTests(SimpleTestCase):
+    """Test the check of the cache keeping replica pins"""
+
+    def get_ids(self):
+        return [error.id for error in check_replica_pin_cache(None)]
+
+    @override_settings(REPLICA_DATABASES=[], REPLICA_PIN_CACHE_ALIAS=None)
+    def test_no_replicas(self):
+        """Test that no cache is needed without replicas"""
+        self.assertEqual(self.get_ids(), [])
+
+    @override_settings(REPLICA_PIN_CACHE_ALIAS=None)
+    def test_missing_alias(self):
+        """Test that replicas require a pin cache"""
+        self.assertEqual(self.get_ids(), ['core.E001'])
+
+    @override_settings(REPLICA_PIN_CACHE_ALIAS='missing')
+    def test_unknown_alias(self):
+        """Test that the pin cache has to be configured"""
+        self.assertEqual(self.get_ids(), ['core.E002'])
+
+    @override_settings(REPLICA_PIN_CACHE_ALIAS='default')
+    def test_process_local_cache(self):
+        """Test that a cache local to each process is refused"""
+        self.assertEqual(self.get_ids(), ['core.E003'])
+
+    @override_settings(REPLICA_PIN_CACHE_ALIAS='shared')
+    def test_shared_cache(self):
+        """Test that a shared cache passes"""
+        self.assertEqual(self.get_ids(), [])
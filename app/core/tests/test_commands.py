@@ -1,23 +1,275 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.models import Recipe, Tag, Ingredient, ChangeLogEntry
+from recipe.mixins import response_cache
+
+ENSURE_CONNECTION = \
+    'django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection'
+
+
+def write_temp_file(content, suffix):
+    """Write content to a temporary file and return its path"""
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(handle, 'w') as file:
+        file.write(content)
+    return path
+
 
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
         """Tests waiting for db when db is available"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        out = StringIO()
+        with patch(ENSURE_CONNECTION) as ec:
+            call_command('wait_for_db', stdout=out)
+
+        self.assertEqual(ec.call_count, 2)
+        self.assertIn('answered after 1 attempts', out.getvalue())
 
     # noinspection PyTypeChecker
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
-        """Tests waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        """Tests waiting for db with growing, bounded delays"""
+        failures = iter(range(5))
+
+        def ensure_connection():
+            if next(failures, None) is not None:
+                raise OperationalError
+
+        with patch(ENSURE_CONNECTION, side_effect=ensure_connection):
+            call_command(
+                'wait_for_db',
+                interval=1,
+                max_interval=4,
+                stdout=StringIO()
+            )
+
+        delays = [call[0][0] for call in ts.call_args_list]
+        self.assertEqual(len(delays), 5)
+        for delay, backoff in zip(delays, (1, 2, 4, 4, 4)):
+            self.assertGreaterEqual(delay, backoff / 2)
+            self.assertLessEqual(delay, backoff)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Tests giving up on the db after the timeout"""
+        with patch(ENSURE_CONNECTION, side_effect=OperationalError):
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=0, stdout=StringIO())
+
+        ts.assert_not_called()
+
+    def test_wait_for_db_all(self):
+        """Tests waiting for every configured database"""
+        out = StringIO()
+        with patch(ENSURE_CONNECTION):
+            call_command('wait_for_db', '--all', stdout=out)
+
+        self.assertIn('Database is available!', out.getvalue())
+
+    def test_export_recipes(self):
+        """Tests exporting the recipes of a user as NDJSON"""
+        user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        for title in ('Curry', 'Salad', 'Soup'):
+            recipe = Recipe.objects.create(
+                user=user, title=title, time_minutes=5, price=5
+            )
+            recipe.tags.add(tag)
+        out = StringIO()
+
+        call_command('export_recipes', user.email, chunk_size=2, stdout=out)
+
+        recipes = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [recipe['title'] for recipe in recipes],
+            ['Curry', 'Salad', 'Soup']
+        )
+        self.assertEqual(
+            recipes[0]['tags'], [{'id': tag.id, 'name': 'Vegan'}]
+        )
+
+    def test_export_recipes_unknown_user(self):
+        """Tests exporting the recipes of a missing user fails"""
+        with self.assertRaises(CommandError):
+            call_command('export_recipes', 'missing@mkznd.com')
+
+    def test_import_recipes_ndjson(self):
+        """Tests importing recipes from NDJSON in batches"""
+        user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        existing = Tag.objects.create(user=user, name='Vegan')
+        lines = [
+            {'title': 'Curry', 'time_minutes': 30, 'price': '7.50',
+             'tags': ['Vegan', 'Spicy'], 'ingredients': ['Rice']},
+            {'title': 'Salad', 'time_minutes': 5, 'price': 3,
+             'tags': [{'id': 1, 'name': 'Vegan'}], 'ingredients': []},
+            {'title': 'Rice', 'time_minutes': 15, 'price': 1,
+             'link': 'https://mkznd.com', 'ingredients': ['Rice']},
+        ]
+        path = write_temp_file(
+            '\n'.join(json.dumps(line) for line in lines), '.ndjson'
+        )
+        self.addCleanup(os.remove, path)
+
+        call_command(
+            'import_recipes', user.email, path, batch_size=2,
+            stdout=StringIO()
+        )
+
+        curry = Recipe.objects.get(user=user, title='Curry')
+        self.assertEqual(str(curry.price), '7.50')
+        self.assertEqual(
+            sorted(tag.name for tag in curry.tags.all()), ['Spicy', 'Vegan']
+        )
+        self.assertIn(existing, curry.tags.all())
+        self.assertEqual(Tag.objects.filter(user=user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=user).count(), 1)
+        rice = Recipe.objects.get(user=user, title='Rice')
+        self.assertEqual(rice.link, 'https://mkznd.com')
+        self.assertEqual(rice.ingredients.get().name, 'Rice')
+        logged = ChangeLogEntry.objects.filter(user=user)
+        self.assertEqual(logged.filter(model_name='recipe').count(), 3)
+        self.assertTrue(logged.filter(
+            model_name='tag',
+            object_id=Tag.objects.get(name='Spicy').id
+        ).exists())
+
+    def test_import_recipes_csv(self):
+        """Tests importing recipes from CSV"""
+        user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        path = write_temp_file(
+            'title,time_minutes,price,link,tags,ingredients\n'
+            'Curry,30,7.50,,Vegan|Spicy,Rice|Tofu\n',
+            '.csv'
+        )
+        self.addCleanup(os.remove, path)
+
+        call_command('import_recipes', user.email, path, stdout=StringIO())
+
+        recipe = Recipe.objects.get(user=user)
+        self.assertEqual(recipe.title, 'Curry')
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.ingredients.count(), 2)
+
+    def test_import_recipes_invalid_record(self):
+        """Tests importing an invalid record fails with its line number"""
+        user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        path = write_temp_file('{"title": "No time"}\n', '.ndjson')
+        self.addCleanup(os.remove, path)
+
+        with self.assertRaisesMessage(CommandError, 'Line 1'):
+            call_command('import_recipes', user.email, path)
+
+    def test_import_recipes_validates_fields(self):
+        """Tests importing a record the API would refuse fails"""
+        user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        path = write_temp_file(
+            '{"title": "Curry", "time_minutes": 30, "price": "5.00"}\n'
+            '{"title": "Caviar", "time_minutes": 5, "price": "123456.78"}\n',
+            '.ndjson'
+        )
+        self.addCleanup(os.remove, path)
+
+        with self.assertRaisesMessage(CommandError, 'Line 2: invalid recipe '
+                                      '(price:'):
+            call_command('import_recipes', user.email, path)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_import_recipes_ingredient_of_other_user(self):
+        """Tests importing an ingredient name of another user fails early"""
+        user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        Ingredient.objects.create(user=user2, name='Salt')
+        path = write_temp_file(
+            '{"title": "Curry", "time_minutes": 30, "price": 5, '
+            '"tags": ["Vegan"], "ingredients": ["Rice", "Salt"]}\n',
+            '.ndjson'
+        )
+        self.addCleanup(os.remove, path)
+
+        with self.assertRaisesMessage(CommandError, 'Salt already belong'):
+            call_command('import_recipes', user.email, path)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Ingredient.objects.filter(user=user).exists())
+
+    def test_provision_users(self):
+        """Tests creating users in bulk from a CSV file"""
+        get_user_model().objects.create_user(email='taken@mkznd.com')
+        path = write_temp_file(
+            'email,password,name\n'
+            'one@mkznd.com,pass1,One\n'
+            'taken@mkznd.com,pass2,Taken\n'
+            'two@mkznd.com,pass3,Two\n',
+            '.csv'
+        )
+        self.addCleanup(os.remove, path)
+        out = StringIO()
+
+        call_command(
+            'provision_users', path, processes=2, batch_size=2, stdout=out
+        )
+
+        self.assertIn('Created 2 users, skipped 1', out.getvalue())
+        user = get_user_model().objects.get(email='two@mkznd.com')
+        self.assertEqual(user.name, 'Two')
+        self.assertTrue(user.check_password('pass3'))
+
+    def test_compact_changes(self):
+        """Tests compacting the change log"""
+        user = get_user_model().objects.create_user(email='test@mkznd.com')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        tag.delete()
+        out = StringIO()
+
+        call_command('compact_changes', days=0, stdout=out)
+
+        self.assertIn(
+            'Deleted 1 superseded entries and 1 tombstones',
+            out.getvalue()
+        )
+        self.assertFalse(ChangeLogEntry.objects.exists())
+
+    def test_response_cache_stats(self):
+        """Tests reporting and resetting the response cache counters"""
+        response_cache.reset_stats()
+        for key in ('missing', 'missing', 'cached'):
+            response_cache.get(key)
+        response_cache.set('cached', b'[]', 'application/json')
+        response_cache.get('cached')
+        out = StringIO()
+
+        call_command('response_cache_stats', '--reset', stdout=out)
+
+        self.assertIn('Hits: 1, misses: 3, hit rate: 25.0%', out.getvalue())
+        self.assertEqual(response_cache.stats(), {'hits': 0, 'misses': 0})
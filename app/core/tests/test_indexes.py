@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Tag, Ingredient, Recipe
+
+
+def explain(queryset):
+    """Return the query plan of a queryset as text
+
+    PostgreSQL prefers sequential scans on small tables, so they are
+    disabled to check that an index path exists at all.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+    return queryset.explain()
+
+
+def is_table_scan(line, table):
+    """Tells whether a line of a query plan scans the whole table"""
+    if connection.vendor == 'postgresql':
+        return f'Seq Scan on {table}' in line
+    words = line.split()
+    if 'SCAN' not in words or 'INDEX' in words:
+        return False
+    return words[words.index('SCAN') + 1:][:1] == [table]
+
+
+def is_sort(line):
+    """Tells whether a line of a query plan sorts rows"""
+    if connection.vendor == 'postgresql':
+        return line.strip(' ->').startswith('Sort')
+    return 'TEMP B-TREE' in line
+
+
+class IndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        other = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        for user in (cls.user, other):
+            Tag.objects.bulk_create(
+                Tag(user=user, name=f'Tag {i}') for i in range(50)
+            )
+            Ingredient.objects.bulk_create(
+                Ingredient(user=user, name=f'{user.email} {i}')
+                for i in range(50)
+            )
+            for i in range(50):
+                recipe = Recipe.objects.create(
+                    user=user,
+                    title=f'Recipe {i}',
+                    time_minutes=5,
+                    price=5
+                )
+                recipe.tags.add(*Tag.objects.filter(user=user)[i:i + 3])
+                recipe.ingredients.add(
+                    *Ingredient.objects.filter(user=user)[i:i + 3]
+                )
+        cls.tag = Tag.objects.filter(user=cls.user).first()
+        cls.ingredient = Ingredient.objects.filter(user=cls.user).first()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexed(self, queryset, tables, ordered=False):
+        """Assert the plan reads tables through indexes without sorting"""
+        plan = explain(queryset)
+        for line in plan.splitlines():
+            for table in tables:
+                self.assertFalse(is_table_scan(line, table), plan)
+            if ordered:
+                self.assertFalse(is_sort(line), plan)
+
+    def test_tag_list_uses_index(self):
+        """Test that listing tags reads them in index order"""
+        queryset = Tag.objects.filter(user=self.user).order_by('-name', '-id')
+        self.assertIndexed(queryset, ['core_tag'], ordered=True)
+
+    def test_ingredient_list_uses_index(self):
+        """Test that listing ingredients reads them in index order"""
+        queryset = Ingredient.objects.filter(
+            user=self.user
+        ).order_by('-name', '-id')
+        self.assertIndexed(queryset, ['core_ingredient'], ordered=True)
+
+    def test_recipe_list_uses_index(self):
+        """Test that listing recipes reads them in index order"""
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+        self.assertIndexed(queryset, ['core_recipe'], ordered=True)
+
+    def test_recipes_with_tag_use_index(self):
+        """Test that recipes with a tag are found through indexes"""
+        queryset = Recipe.objects.filter(user=self.user, tags=self.tag)
+        self.assertIndexed(queryset, ['core_recipe', 'core_recipe_tags'])
+
+    def test_recipes_with_ingredient_use_index(self):
+        """Test that recipes with an ingredient are found through indexes"""
+        queryset = Recipe.objects.filter(
+            user=self.user,
+            ingredients=self.ingredient
+        )
+        self.assertIndexed(
+            queryset,
+            ['core_recipe', 'core_recipe_ingredients']
+        )
@@ -1,5 +1,8 @@
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
 # noinspection PyUnresolvedReferences
 from core import models
 
@@ -59,6 +62,91 @@ class ModelTests(TestCase):
         self.assertTrue(user.is_staff)
         self.assertTrue(user.is_superuser)
 
+    def test_create_superuser_single_insert(self):
+        """Tests that creating a superuser writes it once"""
+        with self.assertNumQueries(1):
+            get_user_model().objects.create_superuser(
+                email='test@mkznd.com',
+                password='12345'
+            )
+
+    def test_bulk_create_users(self):
+        """Tests creating users in bulk, skipping taken emails"""
+        sample_user(email='taken@mkznd.com')
+
+        with self.assertNumQueries(2):
+            users = get_user_model().objects.bulk_create_users([
+                {'email': 'one@MKZND.com', 'password': 'pass1', 'name': 'A'},
+                {'email': 'two@mkznd.com', 'password': 'pass2'},
+                {'email': 'taken@mkznd.com', 'password': 'pass3'},
+                {'email': 'two@mkznd.com', 'password': 'pass4'},
+            ])
+
+        self.assertEqual(
+            [user.email for user in users],
+            ['one@mkznd.com', 'two@mkznd.com']
+        )
+        user = get_user_model().objects.get(email='one@mkznd.com')
+        self.assertEqual(user.name, 'A')
+        self.assertTrue(user.check_password('pass1'))
+
+    def test_delete_user_with_collection(self):
+        """Tests deleting a user deletes its collection version along with
+        its recipes"""
+        user = sample_user()
+        models.Recipe.objects.create(
+            user=user,
+            title='Curry',
+            time_minutes=5,
+            price=5.00
+        )
+        user_id = user.pk
+
+        user.delete()
+
+        self.assertFalse(
+            models.CollectionVersion.objects.filter(user_id=user_id).exists()
+        )
+        self.assertFalse(models.Recipe.objects.exists())
+
+    def test_delete_users_queryset_with_collection(self):
+        """Tests deleting users with a queryset deletes their collection
+        versions along with their recipes"""
+        user = sample_user()
+        models.Recipe.objects.create(
+            user=user,
+            title='Curry',
+            time_minutes=5,
+            price=5.00
+        )
+
+        get_user_model().objects.filter(pk=user.pk).delete()
+
+        self.assertFalse(models.CollectionVersion.objects.exists())
+        self.assertFalse(models.Recipe.objects.exists())
+
+    def test_failed_user_delete_unmarked(self):
+        """Tests a user whose deletion fails is no longer marked as being
+        deleted"""
+        user = sample_user()
+
+        with patch('django.db.models.sql.DeleteQuery.delete_batch',
+                   side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                user.delete()
+
+        self.assertFalse(models.is_deleting_user(user.pk))
+        models.Recipe.objects.create(
+            user=user,
+            title='Curry',
+            time_minutes=5,
+            price=5.00
+        ).delete()
+        self.assertTrue(models.ChangeLogEntry.objects.filter(
+            user=user,
+            deleted=True
+        ).exists())
+
     def test_tag_str(self):
         """Test tag string representation"""
         tag = models.Tag.objects.create(
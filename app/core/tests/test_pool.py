@@ -0,0 +1,187 @@
+import sqlite3
+import threading
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+def check_sqlite(conn):
+    """Return whether an SQLite connection answers a trivial query"""
+    conn.execute('SELECT 1')
+    return True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test the connection pool with SQLite connections"""
+
+    def make_pool(self, **kwargs):
+        pool = ConnectionPool(
+            lambda: sqlite3.connect(':memory:', check_same_thread=False),
+            **kwargs
+        )
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_connections_reused(self):
+        """Test that returned connections are checked out again"""
+        pool = self.make_pool(max_size=2)
+
+        conn = pool.get()
+        pool.put(conn)
+
+        self.assertIs(pool.get(), conn)
+        stats = pool.stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_min_size_opened_upfront(self):
+        """Test that min_size connections are opened on creation"""
+        pool = self.make_pool(min_size=3, max_size=5)
+
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 3)
+        self.assertEqual(stats['idle'], 3)
+
+    def test_overflow_connections_closed_on_return(self):
+        """Test that connections beyond max_size are not kept"""
+        pool = self.make_pool(max_size=1, max_overflow=1)
+
+        first = pool.get()
+        second = pool.get()
+        pool.put(second)
+        pool.put(first)
+
+        stats = pool.stats()
+        self.assertEqual(stats['overflows'], 1)
+        self.assertEqual(stats['size'], 1)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            second.execute('SELECT 1')
+
+    def test_timeout_when_exhausted(self):
+        """Test that a checkout fails after waiting for a full pool"""
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.get()
+
+        with self.assertRaises(PoolTimeout):
+            pool.get()
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_waiting_checkout_gets_returned_connection(self):
+        """Test that a checkout waits for a connection to be returned"""
+        pool = self.make_pool(max_size=1, timeout=5)
+        conn = pool.get()
+        timer = threading.Timer(0.05, pool.put, [conn])
+        timer.start()
+
+        self.assertIs(pool.get(), conn)
+        timer.join()
+        self.assertGreater(pool.stats()['max_wait_time'], 0)
+
+    def test_failed_health_check_discards_connection(self):
+        """Test that a broken idle connection is replaced on checkout"""
+        pool = self.make_pool(max_size=1, check=check_sqlite)
+        conn = pool.get()
+        pool.put(conn)
+        conn.close()
+
+        replacement = pool.get()
+
+        self.assertIsNot(replacement, conn)
+        replacement.execute('SELECT 1')
+        stats = pool.stats()
+        self.assertEqual(stats['failed_checks'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_health_check_skipped_for_recent_connections(self):
+        """Test that connections returned recently are not checked"""
+        calls = []
+        pool = self.make_pool(
+            check=lambda conn: calls.append(conn) or True,
+            check_interval=60
+        )
+        pool.put(pool.get())
+
+        pool.get()
+
+        self.assertEqual(calls, [])
+
+    def test_max_age_replaces_old_connections(self):
+        """Test that connections older than max_age are not reused"""
+        pool = self.make_pool(max_age=0)
+        conn = pool.get()
+        pool.put(conn)
+
+        self.assertIsNot(pool.get(), conn)
+        self.assertEqual(pool.stats()['connections_opened'], 2)
+
+    def test_failed_reset_discards_connection(self):
+        """Test that a connection failing to reset is not reused"""
+        def reset(conn):
+            raise sqlite3.OperationalError('broken')
+
+        pool = self.make_pool(reset=reset)
+        conn = pool.get()
+        pool.put(conn)
+
+        self.assertIsNot(pool.get(), conn)
+
+    def test_failed_connect_frees_slot(self):
+        """Test that a failing connect does not use up the pool"""
+        attempts = []
+
+        def connect():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise sqlite3.OperationalError('refused')
+            return sqlite3.connect(':memory:')
+
+        pool = ConnectionPool(connect, max_size=1, timeout=0.05)
+
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.get()
+        pool.get()
+        self.assertEqual(pool.stats()['size'], 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL backend only')
+class PooledBackendTests(SimpleTestCase):
+    """Test the pooled PostgreSQL backend"""
+
+    databases = {'default'}
+
+    def test_connection_returned_to_pool(self):
+        """Test that closing a connection returns it for reuse"""
+        from core.db.backends.postgresql.base import pool_stats
+
+        connection.close()
+        connection.ensure_connection()
+        raw = connection.connection
+        connection.close()
+        connection.ensure_connection()
+
+        self.assertIs(connection.connection, raw)
+        self.assertTrue(pool_stats())
+
+    def test_checked_connection_left_idle(self):
+        """Test that the health check leaves no transaction open"""
+        from psycopg2 import extensions
+        from core.db.backends.postgresql.base import check_connection
+
+        connection.ensure_connection()
+        raw = connection.connection
+        connection.set_autocommit(False)
+        self.addCleanup(connection.close)
+        raw.cursor().execute('SELECT 1')
+
+        self.assertTrue(check_connection(raw))
+
+        self.assertEqual(
+            raw.get_transaction_status(),
+            extensions.TRANSACTION_STATUS_IDLE
+        )
+        self.assertTrue(raw.autocommit)
@@ -0,0 +1,208 @@
+import asyncio
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import (
+    SimpleTestCase, TestCase, RequestFactory, override_settings
+)
+
+from core.db.routers import ReplicaRouter, use_replicas
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS)
+class ReplicaRouterTests(SimpleTestCase):
+    """Test routing reads to the read replicas"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_primary_by_default(self):
+        """Test that reads outside use_replicas go to the primary"""
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_round_robin(self):
+        """Test that replicas take turns serving blocks of reads"""
+        aliases = []
+        for _ in range(4):
+            with use_replicas():
+                aliases.append(self.router.db_for_read(Recipe))
+
+        self.assertEqual(aliases, REPLICAS * 2)
+
+    def test_block_reads_one_replica(self):
+        """Test that all reads of a block go to the same replica"""
+        with use_replicas():
+            aliases = {self.router.db_for_read(Recipe) for _ in range(4)}
+
+        self.assertEqual(len(aliases), 1)
+
+    def test_writes_use_primary(self):
+        """Test that writes always go to the primary"""
+        with use_replicas():
+            self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    @override_settings(REPLICA_SELECTION='least-lag', REPLICA_MAX_LAG=10)
+    def test_least_lag(self):
+        """Test choosing the replica furthest ahead, or the primary if all
+        lag too far behind"""
+        lags = {'replica1': 3.0, 'replica2': 0.5}
+        with patch('core.db.routers.measure_lag', side_effect=lags.get):
+            self.assertEqual(self.router.choose_replica(), 'replica2')
+
+        router = ReplicaRouter()
+        with patch('core.db.routers.measure_lag', return_value=60.0):
+            self.assertEqual(router.choose_replica(), 'default')
+
+    @override_settings(REPLICA_SELECTION='least-lag',
+                       REPLICA_LAG_CHECK_INTERVAL=60)
+    def test_lag_measured_once_per_interval(self):
+        """Test that replica lag is cached between checks"""
+        with patch('core.db.routers.measure_lag', return_value=0.0) as ml:
+            for _ in range(3):
+                self.router.choose_replica()
+
+        self.assertEqual(ml.call_count, len(REPLICAS))
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS, REPLICA_STICKY_SECONDS=5,
+                   REPLICA_PIN_CACHE_ALIAS='default')
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Test the middleware routing safe requests to replicas"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.routed = []
+        self.writes = True
+        self.status = 200
+
+        def view(request):
+            self.routed.append(self.router.db_for_read(Recipe))
+            if self.writes:
+                self.router.db_for_write(Recipe)
+            return HttpResponse(status=self.status)
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+
+    def tearDown(self):
+        cache.clear()
+
+    def request(self, method, token):
+        request = getattr(self.factory, method)(
+            '/', HTTP_AUTHORIZATION=f'Token {token}'
+        )
+        self.middleware(request)
+        return self.routed[-1]
+
+    def test_safe_requests_use_replicas(self):
+        """Test that GET requests read from a replica"""
+        self.assertIn(self.request('get', 'a'), REPLICAS)
+
+    def test_unsafe_requests_use_primary(self):
+        """Test that POST requests read from the primary"""
+        self.assertEqual(self.request('post', 'a'), 'default')
+
+    @override_settings(REPLICA_PIN_CACHE_ALIAS=None)
+    def test_no_pin_cache_uses_primary(self):
+        """Test that requests read from the primary without a pin cache"""
+        self.assertEqual(self.request('get', 'a'), 'default')
+
+    def test_reads_after_write_stick_to_primary(self):
+        """Test that a client reads from the primary after writing"""
+        self.request('post', 'a')
+
+        self.assertEqual(self.request('get', 'a'), 'default')
+        self.assertIn(self.request('get', 'b'), REPLICAS)
+
+    def test_read_only_unsafe_request_does_not_pin(self):
+        """Test that an unsafe request which didn't write doesn't pin the
+        client to the primary"""
+        self.writes = False
+        self.request('post', 'a')
+
+        self.assertIn(self.request('get', 'a'), REPLICAS)
+
+    def test_failed_request_does_not_pin(self):
+        """Test that a failed unsafe request doesn't pin the client to the
+        primary"""
+        self.status = 400
+        self.request('post', 'a')
+
+        self.assertIn(self.request('get', 'a'), REPLICAS)
+
+    def test_request_reads_one_replica(self):
+        """Test that all reads of a request go to the same replica"""
+        routed = []
+
+        def view(request):
+            for _ in range(3):
+                routed.append(self.router.db_for_read(Recipe))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+
+        self.assertEqual(len(set(routed)), 1)
+        self.assertIn(routed[0], REPLICAS)
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS, REPLICA_STICKY_SECONDS=5,
+                   REPLICA_PIN_CACHE_ALIAS='default')
+class AsyncReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Test the middleware in front of async views"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.routed = []
+
+        async def view(request):
+            self.routed.append(self.router.db_for_read(Recipe))
+            if request.method == 'POST':
+                await sync_to_async(self.router.db_for_write)(Recipe)
+            return HttpResponse()
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+
+    def tearDown(self):
+        cache.clear()
+
+    async def request(self, method, token):
+        request = getattr(self.factory, method)(
+            '/', HTTP_AUTHORIZATION=f'Token {token}'
+        )
+        await self.middleware(request)
+        return self.routed[-1]
+
+    def test_coroutine_function(self):
+        """Test that the middleware is async in front of an async view"""
+        self.assertTrue(asyncio.iscoroutinefunction(self.middleware))
+
+    async def test_safe_requests_use_replicas(self):
+        """Test that GET requests read from a replica"""
+        self.assertIn(await self.request('get', 'a'), REPLICAS)
+
+    async def test_reads_after_write_stick_to_primary(self):
+        """Test that a client reads from the primary after writing from
+        a thread"""
+        self.assertEqual(await self.request('post', 'a'), 'default')
+
+        self.assertEqual(await self.request('get', 'a'), 'default')
+        self.assertIn(await self.request('get', 'b'), REPLICAS)
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS)
+class ReplicaRouterTransactionTests(TestCase):
+    """Test routing reads inside transactions"""
+
+    def test_reads_in_transaction_use_primary(self):
+        """Test that reads inside a transaction go to the primary"""
+        with use_replicas():
+            self.assertEqual(ReplicaRouter().db_for_read(Recipe), 'default')
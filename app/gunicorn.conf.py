@@ -0,0 +1,35 @@
+"""Gunicorn configuration serving the app over WSGI or ASGI
+
+SERVER_INTERFACE=wsgi runs pre-forked workers with threads, each thread
+serving one request at a time. SERVER_INTERFACE=asgi runs uvicorn workers,
+one per CPU, each serving many requests from an event loop.
+"""
+import multiprocessing
+import os
+
+interface = os.environ.get('SERVER_INTERFACE', 'wsgi')
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('SERVER_BIND', '0.0.0.0:8000')
+
+if interface == 'asgi':
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.environ.get('SERVER_WORKERS', cpu_count))
+elif interface == 'wsgi':
+    wsgi_app = 'app.wsgi:application'
+    worker_class = 'gthread'
+    workers = int(os.environ.get('SERVER_WORKERS', cpu_count * 2 + 1))
+    threads = int(os.environ.get('SERVER_THREADS', 4))
+else:
+    raise ValueError(f'Unknown SERVER_INTERFACE {interface!r}')
+
+# Restart workers now and then to bound memory growth, at staggered times
+max_requests = int(os.environ.get('SERVER_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('SERVER_TIMEOUT', 30))
+keepalive = int(os.environ.get('SERVER_KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
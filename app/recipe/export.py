@@ -0,0 +1,78 @@
+import json
+import tempfile
+
+from django.db.models import prefetch_related_objects
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from recipe.serializers import RecipeDetailSerializer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Renderer for newline delimited JSON"""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return to_ndjson(data).encode()
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """Content negotiation ignoring the Accept header of the client
+
+    Exports are NDJSON whatever the client asks for, so clients sending
+    Accept: application/json aren't refused with 406.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def to_ndjson(data):
+    """Return data as a line of JSON"""
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_recipes(queryset, chunk_size=1000):
+    """Yield recipes with their tags and ingredients as NDJSON lines
+
+    Recipes are read with a server-side cursor and their relations are
+    prefetched a chunk at a time, so memory use does not depend on the
+    number of recipes.
+    """
+    chunk = []
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(recipe)
+        if len(chunk) == chunk_size:
+            yield from serialize_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from serialize_chunk(chunk)
+
+
+def serialize_chunk(recipes):
+    """Yield a chunk of recipes as NDJSON lines"""
+    prefetch_related_objects(recipes, 'tags', 'ingredients')
+    for data in RecipeDetailSerializer(recipes, many=True).data:
+        yield to_ndjson(data)
+
+
+def spool(lines):
+    """Write lines to a temporary file and return it rewound with its size
+
+    Django 3.2 iterates streaming responses of ASGI requests on the event
+    loop, where queries are refused, so those read the export from a file
+    written by the view instead.
+    """
+    file = tempfile.TemporaryFile()
+    for line in lines:
+        file.write(line.encode())
+    size = file.tell()
+    file.seek(0)
+    return file, size
@@ -0,0 +1,191 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.response import Response
+
+from core.models import CollectionVersion
+
+
+class ResponseCache:
+    """Cache of rendered responses counting its hits and misses
+
+    The counters are kept in the cache next to the responses, so they add
+    up the requests of all processes sharing it. They can be evicted like
+    any other entry, and are read with the response_cache_stats command.
+    """
+
+    key_prefix = 'response:'
+    stats_prefix = 'response-stats:'
+    counters = ('hits', 'misses')
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+
+    def get(self, key):
+        """Return the cached content and content type for a key or None"""
+        cached = caches[self.alias].get(self.key_prefix + key)
+        self.count('misses' if cached is None else 'hits')
+        return cached
+
+    def set(self, key, content, content_type):
+        """Cache rendered content under a key"""
+        caches[self.alias].set(
+            self.key_prefix + key,
+            (content, content_type),
+            self.timeout
+        )
+
+    def count(self, counter):
+        """Add one to a counter"""
+        cache = caches[self.alias]
+        key = self.stats_prefix + counter
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between the add and the incr
+                cache.add(key, 1, None)
+
+    def stats(self):
+        """Return the hit and miss counters"""
+        values = caches[self.alias].get_many(
+            [self.stats_prefix + counter for counter in self.counters]
+        )
+        return {counter: values.get(self.stats_prefix + counter, 0)
+                for counter in self.counters}
+
+    def reset_stats(self):
+        """Set the counters back to zero"""
+        caches[self.alias].delete_many(
+            [self.stats_prefix + counter for counter in self.counters]
+        )
+
+
+response_cache = ResponseCache(
+    alias=getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default'),
+    timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+)
+
+
+class CollectionStateMixin:
+    """Look up the collection version of the user once per request"""
+
+    def get_collection_state(self):
+        """Return the version of the collection of the user and the time
+        it last changed"""
+        if not hasattr(self, '_collection_state'):
+            self._collection_state = CollectionVersion.current(
+                self.request.user.pk
+            )
+        return self._collection_state
+
+    def get_state_key(self, request):
+        """Return a key identifying the response for the collection state"""
+        key = ':'.join(str(part) for part in (
+            request.user.pk,
+            type(self).__name__,
+            self.action,
+            request.get_full_path(),
+            request.accepted_media_type,
+            *self.get_collection_state()
+        ))
+        return hashlib.md5(key.encode()).hexdigest()
+
+
+class ConditionalResponseMixin(CollectionStateMixin):
+    """Answer conditional requests from the collection version of the user
+
+    The ETag is derived from the collection version, so a matching
+    If-None-Match header gets a 304 response before the main query runs or
+    any serializer is built. No Last-Modified is sent, since a date with
+    one second resolution can't tell apart writes made within a second.
+    """
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """Return a 304 response if the client copy is current, otherwise
+        the response of the handler with the ETag set"""
+        etag = '"{}"'.format(self.get_state_key(request))
+
+        response = get_conditional_response(request, etag=etag)
+        if response is not None and \
+                (self.lookup_url_kwarg or self.lookup_field) in self.kwargs:
+            # The ETag covers the collection, not whether the object of a
+            # detail request exists
+            self.check_object_exists()
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def check_object_exists(self):
+        """Raise Http404 unless the object of a detail request exists"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            exists = self.filter_queryset(self.get_queryset()).filter(**{
+                self.lookup_field: self.kwargs[lookup_url_kwarg]
+            }).exists()
+        except (TypeError, ValueError, ValidationError):
+            exists = False
+        if not exists:
+            raise Http404
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+
+class CachedListMixin(CollectionStateMixin):
+    """Serve list responses from a cache of rendered content
+
+    Entries are keyed by the collection version of the user, so any write
+    to the collection, which bumps the version, invalidates them.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'api':
+            return super().list(request, *args, **kwargs)
+
+        key = self.get_state_key(request)
+        cached = response_cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        self._response_cache_key = key
+        return super().list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        key = getattr(self, '_response_cache_key', None)
+        if key is not None and response.status_code == 200:
+            response.render()
+            response_cache.set(key, response.content, response['Content-Type'])
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+class ValuesListMixin:
+    """Build list responses from values() rows
+
+    The view provides get_values_queryset() and represent_rows(), which
+    skip creating model instances and serializers for every row.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_values_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.represent_rows(page))
+        return Response(self.represent_rows(list(queryset)))
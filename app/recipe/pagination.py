@@ -0,0 +1,147 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on the queryset ordering
+
+    The cursor holds the ordering values of the last row of a page and the
+    next page is fetched with a WHERE clause resuming after them, so deep
+    pages cost the same as the first one. The ordering must end with the
+    primary key to be unique. Pages hold page_size rows unless the client
+    asks for another size, up to max_page_size.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return a single page of results"""
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        self.ordering_fields = self.get_ordering_fields(queryset)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        """Return the requested page size, capped at max_page_size, or the
+        default one"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size > 0:
+            return min(page_size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """Return the ordering of the queryset, ending with the pk"""
+        ordering = tuple(queryset.query.order_by)
+        assert ordering and ordering[-1].lstrip('-') in ('id', 'pk'), (
+            'KeysetPagination requires an ordering ending with the primary '
+            'key, got {!r}.'.format(ordering)
+        )
+        return ordering
+
+    def get_ordering_fields(self, queryset):
+        """Return the model or annotation field of each ordering name"""
+        fields = []
+        for name in self.ordering:
+            name = name.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            if annotation is not None:
+                fields.append(annotation.output_field)
+            elif name == 'pk':
+                fields.append(queryset.model._meta.pk)
+            else:
+                fields.append(queryset.model._meta.get_field(name))
+        return fields
+
+    def get_position_filter(self, position):
+        """Return a filter matching rows ordered after the position"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, row):
+        """Return the ordering values of a row"""
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def decode_cursor(self, request):
+        """Return the position stored in the request cursor, if any"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [field.to_python(value) for field, value
+                        in zip(self.ordering_fields, position)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        """Return an opaque cursor for the position"""
+        data = json.dumps(position, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def get_next_link(self):
+        """Return the url of the next page or None on the last page"""
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def get_paginated_response(self, data):
+        """Return the page with a link to the next one"""
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
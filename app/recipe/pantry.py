@@ -0,0 +1,174 @@
+"""Matching recipes against the ingredients a user has on hand
+
+Each user gets an in-process index holding the ingredients of every
+recipe as an integer bitmap, one bit per ingredient. A recipe is covered
+by a pantry when its bitmap has no bits outside the pantry bitmap. The
+index is built from the through table on first use and caught up from the
+change log afterwards, so writes made by any process are seen.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import router, transaction
+
+from core.models import Recipe, CollectionVersion, ChangeLogEntry
+
+
+def count_bits(value, limit):
+    """Return the number of set bits of a non-negative integer, counting
+    no further than limit + 1"""
+    count = 0
+    while value and count <= limit:
+        value &= value - 1
+        count += 1
+    return count
+
+
+class PantryIndex:
+    """Ingredient bitmaps of the recipes of a user"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.seq = None
+        self.bits = {}
+        self.ingredient_ids = []
+        self.recipes = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Bring the index up to date with the collection of the user
+
+        Everything is read from one database in one transaction, so the
+        changes and recipes read are never older than the version they are
+        recorded under.
+        """
+        alias = router.db_for_read(Recipe)
+        with self._lock, transaction.atomic(using=alias, savepoint=False):
+            version, compacted_seq = CollectionVersion.objects.using(
+                alias
+            ).filter(user_id=self.user_id).values_list(
+                'version', 'compacted_seq'
+            ).first() or (0, 0)
+            if self.seq == version:
+                return
+            if self.seq is None or self.seq < compacted_seq:
+                self.build(alias, version)
+                return
+            recipe_ids = set(ChangeLogEntry.objects.using(alias).filter(
+                user_id=self.user_id,
+                model_name='recipe',
+                seq__gt=self.seq,
+                seq__lte=version
+            ).values_list('object_id', flat=True))
+            if len(recipe_ids) > len(self.recipes) // 2:
+                self.build(alias, version)
+                return
+            for recipe_id in recipe_ids:
+                self.recipes.pop(recipe_id, None)
+            self.load(Recipe.objects.using(alias).filter(pk__in=recipe_ids))
+            self.seq = version
+
+    def build(self, alias, version):
+        """Load the bitmaps of all recipes of the user"""
+        self.bits = {}
+        self.ingredient_ids = []
+        self.recipes = {}
+        self.load(Recipe.objects.using(alias))
+        self.seq = version
+
+    def load(self, queryset):
+        """Set the bitmaps of the recipes of the user in a queryset"""
+        rows = queryset.filter(user_id=self.user_id).values_list(
+            'id', 'ingredients'
+        )
+        for recipe_id, ingredient_id in rows.iterator():
+            bitmap = self.recipes.get(recipe_id, 0)
+            if ingredient_id is not None:
+                bitmap |= 1 << self.bit(ingredient_id)
+            self.recipes[recipe_id] = bitmap
+
+    def bit(self, ingredient_id):
+        """Return the bit of an ingredient, assigning the next free one"""
+        position = self.bits.get(ingredient_id)
+        if position is None:
+            position = self.bits[ingredient_id] = len(self.ingredient_ids)
+            self.ingredient_ids.append(ingredient_id)
+        return position
+
+    def match(self, ingredient_ids, max_missing=0, limit=None, after=None):
+        """Return the number of recipes missing at most max_missing of
+        their ingredients from the pantry, and the ids of the first limit
+        of them with the ids of their missing ingredients
+
+        Recipes missing fewer ingredients come first, then newer ones. With
+        after set to the missing count and id of a recipe, only recipes
+        ordered after it are returned.
+        """
+        start = (after[0], -after[1]) if after is not None else None
+        with self._lock:
+            pantry = 0
+            for ingredient_id in ingredient_ids:
+                position = self.bits.get(ingredient_id)
+                if position is not None:
+                    pantry |= 1 << position
+            count = 0
+            matches = []
+            for recipe_id, bitmap in self.recipes.items():
+                missing = bitmap & ~pantry
+                if not missing:
+                    key = (0, -recipe_id)
+                elif max_missing:
+                    key = (count_bits(missing, max_missing), -recipe_id)
+                    if key[0] > max_missing:
+                        continue
+                else:
+                    continue
+                count += 1
+                if start is None or key > start:
+                    matches.append((key, missing))
+            matches.sort()
+            return count, [
+                (-recipe_id, self.decode(missing))
+                for (_, recipe_id), missing in matches[:limit]
+            ]
+
+    def decode(self, bitmap):
+        """Return the sorted ingredient ids of the bits of a bitmap"""
+        ids = []
+        while bitmap:
+            lowest = bitmap & -bitmap
+            ids.append(self.ingredient_ids[lowest.bit_length() - 1])
+            bitmap ^= lowest
+        return sorted(ids)
+
+
+class PantryIndexCache:
+    """Least recently used pantry indexes of users"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the up to date index of a user"""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = self._indexes[user_id] = PantryIndex(user_id)
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+        index.refresh()
+        return index
+
+    def clear(self):
+        """Drop all indexes"""
+        with self._lock:
+            self._indexes.clear()
+
+
+pantry_indexes = PantryIndexCache(
+    max_size=getattr(settings, 'PANTRY_INDEX_MAX_USERS', 100)
+)
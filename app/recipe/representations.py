@@ -0,0 +1,130 @@
+"""Read-only recipe representations built from values() rows
+
+They match the data of RecipeSerializer and RecipeDetailSerializer, with
+relations ordered by id, without creating model instances or serializers
+for each recipe.
+"""
+from collections import defaultdict
+
+from django.db import connections
+from rest_framework import serializers as drf_serializers
+
+from core.models import Recipe
+from recipe.serializers import RecipeSerializer, TagSerializer, \
+    IngredientSerializer
+
+RELATIONS = RecipeSerializer.expandable_fields
+
+ATTRIBUTE_SERIALIZERS = {
+    'tag': TagSerializer,
+    'ingredient': IngredientSerializer,
+}
+
+
+def select_fields(fields):
+    """Return the selected fields in the order of the serializer"""
+    return [name for name in RecipeSerializer.Meta.fields
+            if fields is None or name in fields]
+
+
+def values_queryset(queryset, fields=None, expand=()):
+    """Return a values() queryset of the recipe columns to represent
+
+    The ordering columns are selected too, for pagination. On PostgreSQL
+    the ids of relations that are not expanded are selected as arrays.
+    """
+    fields = select_fields(fields)
+    ordering = [name.lstrip('-') for name in queryset.query.order_by]
+    columns = [name for name in fields if name not in RELATIONS]
+    queryset = queryset.prefetch_related(None)
+    if connections[queryset.db].vendor == 'postgresql':
+        arrays = [relation for relation in RELATIONS
+                  if relation in fields and relation not in expand]
+        queryset = queryset.with_related_id_arrays(arrays)
+        columns += [f'{relation}_ids' for relation in arrays]
+    return queryset.values(*dict.fromkeys(['id', *columns, *ordering]))
+
+
+def represent_recipes(rows, fields=None, expand=()):
+    """Return the representations of recipe rows from values_queryset"""
+    fields = select_fields(fields)
+    declared = RecipeSerializer().fields
+    converters = {
+        name: declared[name].to_representation for name in fields
+        if isinstance(declared[name], drf_serializers.DecimalField)
+    }
+    related = {}
+    for relation in RELATIONS:
+        if relation not in fields:
+            continue
+        if relation in expand:
+            related[relation] = fetch_related(rows, relation)
+        elif rows and f'{relation}_ids' not in rows[0]:
+            related[relation] = fetch_related_ids(rows, relation)
+
+    results = []
+    for row in rows:
+        data = {}
+        for name in fields:
+            if name in related:
+                data[name] = related[name].get(row['id'], [])
+            elif name in RELATIONS:
+                data[name] = row[f'{name}_ids']
+            else:
+                value = row[name]
+                converter = converters.get(name)
+                data[name] = converter(value) \
+                    if converter is not None and value is not None else value
+        results.append(data)
+    return results
+
+
+def through_query(rows, relation):
+    """Return the through rows of a relation for the recipes, ordered by
+    the related id, and the names of its recipe and related columns"""
+    field = RecipeSerializer.Meta.model._meta.get_field(relation)
+    recipe, related = field.m2m_field_name(), field.m2m_reverse_field_name()
+    queryset = field.remote_field.through.objects.filter(**{
+        f'{recipe}__in': [row['id'] for row in rows]
+    }).order_by(f'{related}_id')
+    return queryset, recipe, related
+
+
+def fetch_related_ids(rows, relation):
+    """Return the sorted related ids of each recipe"""
+    queryset, recipe, related = through_query(rows, relation)
+    grouped = defaultdict(list)
+    for recipe_id, related_id in queryset.values_list(
+        f'{recipe}_id', f'{related}_id'
+    ):
+        grouped[recipe_id].append(related_id)
+    return grouped
+
+
+def fetch_related(rows, relation):
+    """Return the nested representations of the related rows of each
+    recipe, sorted by id"""
+    queryset, recipe, related = through_query(rows, relation)
+    names = RELATIONS[relation].Meta.fields
+    grouped = defaultdict(list)
+    for values in queryset.values_list(
+        f'{recipe}_id', *(f'{related}__{name}' for name in names)
+    ):
+        grouped[values[0]].append(dict(zip(names, values[1:])))
+    return grouped
+
+
+def fetch_objects(user, model_name, ids):
+    """Return the representations of the tags, ingredients or recipes of
+    a user with the ids, by id"""
+    if model_name == 'recipe':
+        queryset = Recipe.objects.filter(user=user, pk__in=ids).order_by('id')
+        rows = list(values_queryset(queryset))
+        return {data['id']: data for data in represent_recipes(rows)}
+    serializer_class = ATTRIBUTE_SERIALIZERS[model_name]
+    queryset = serializer_class.Meta.model.objects.filter(
+        user=user,
+        pk__in=ids
+    )
+    return {row['id']: row
+            for row in queryset.values(*serializer_class.Meta.fields)}
@@ -1,4 +1,6 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 from core.models import Tag, Ingredient, Recipe
 
 
@@ -20,20 +22,187 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field accepting only rows of the requesting user
+
+    Objects are looked up with one IN query per batch of ids and kept in
+    the resolved_objects entry of the context, so that several fields and
+    list items of a request share the lookups. With many=True the ids of a
+    field are resolved as one batch.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None:
+            queryset = queryset.filter(user=request.user)
+        return queryset
+
+    def get_memo(self):
+        """Return the objects resolved so far, None for missing ones"""
+        return self.context.setdefault('resolved_objects', {})
+
+    def to_pk(self, data):
+        """Return the primary key in the data or None if it isn't one"""
+        if isinstance(data, bool):
+            return None
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError, ValueError):
+            return None
+
+    def load(self, values):
+        """Look up the objects of values not resolved yet with one query"""
+        queryset = self.get_queryset()
+        model = queryset.model
+        memo = self.get_memo()
+        missing = {pk for pk in map(self.to_pk, values)
+                   if pk is not None and (model, pk) not in memo}
+        if not missing:
+            return
+        for pk in missing:
+            memo[(model, pk)] = None
+        for obj in queryset.filter(pk__in=missing):
+            memo[(model, obj.pk)] = obj
+
+    def resolve(self, values):
+        """Return the objects of a batch of primary keys"""
+        self.load(values)
+        model = self.get_queryset().model
+        memo = self.get_memo()
+        objects = []
+        for value in values:
+            pk = self.to_pk(value)
+            if pk is None:
+                self.fail('incorrect_type', data_type=type(value).__name__)
+            obj = memo[(model, pk)]
+            if obj is None:
+                self.fail('does_not_exist', pk_value=value)
+            objects.append(obj)
+        return objects
+
+    def to_internal_value(self, data):
+        return self.resolve([data])[0]
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """Many related field resolving all its ids in one batch"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return self.child_relation.resolve(list(data))
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Serializer for lists of recipes written with bulk queries"""
+
+    related_fields = ('tags', 'ingredients')
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.resolve_related(data)
+        return super().to_internal_value(data)
+
+    def resolve_related(self, data):
+        """Fetch the tags and ingredients of all items with one query each"""
+        for name in self.related_fields:
+            values = []
+            for item in data:
+                related = item.get(name) if isinstance(item, dict) else None
+                if isinstance(related, list):
+                    values.extend(related)
+            self.child.fields[name].child_relation.load(values)
+
+    def create(self, validated_data):
+        """Create all recipes with bulk inserts"""
+        recipes, tag_ids, ingredient_ids = [], [], []
+        for attrs in validated_data:
+            attrs = dict(attrs)
+            tag_ids.append([tag.pk for tag in attrs.pop('tags', [])])
+            ingredient_ids.append(
+                [ingredient.pk for ingredient in attrs.pop('ingredients', [])]
+            )
+            recipes.append(Recipe(**attrs))
+        return Recipe.objects.bulk_create_with_relations(
+            recipes, tag_ids, ingredient_ids
+        )
+
+    def update(self, instances, validated_data):
+        """Update recipes, given in the order of the data, in bulk"""
+        related_ids = {name: {} for name in self.related_fields}
+        fields = set()
+        for recipe, attrs in zip(instances, validated_data):
+            for name, value in attrs.items():
+                if name in related_ids:
+                    related_ids[name][recipe.pk] = [obj.pk for obj in value]
+                else:
+                    setattr(recipe, name, value)
+                    fields.add(name)
+        return Recipe.objects.bulk_update_with_relations(
+            instances,
+            fields,
+            related_ids['tags'],
+            related_ids['ingredients']
+        )
+
+
+class FieldSelectionMixin:
+    """Keep only the fields named in the fields entry of the context and
+    nest the relations named in its expand entry"""
+
+    expandable_fields = {
+        'tags': TagSerializer,
+        'ingredients': IngredientSerializer,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields).difference(fields):
+                self.fields.pop(name)
+        expand = self.context.get('expand')
+        if expand is None:
+            return
+        for name, serializer_class in self.expandable_fields.items():
+            if name not in self.fields:
+                continue
+            if name in expand:
+                self.fields[name] = serializer_class(many=True, read_only=True)
+            elif not isinstance(self.fields[name],
+                                serializers.ManyRelatedField):
+                self.fields[name] = serializers.PrimaryKeyRelatedField(
+                    many=True,
+                    read_only=True
+                )
+
+
+class RecipeSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     """Serializer for recipe objects"""
 
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = (
             'id', 'title', 'ingredients',
             'tags', 'time_minutes', 'price', 'link'
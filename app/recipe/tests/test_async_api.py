@@ -0,0 +1,181 @@
+import json
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TransactionTestCase, AsyncClient
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.models import Tag, Ingredient, Recipe
+
+ASYNC_TAGS_URL = reverse('recipe:async-tag-list')
+ASYNC_INGREDIENTS_URL = reverse('recipe:async-ingredient-list')
+ASYNC_RECIPES_URL = reverse('recipe:async-recipe-list')
+
+
+def async_detail_url(recipe_id):
+    """Return async recipe detail URL"""
+    return reverse('recipe:async-recipe-detail', args=[recipe_id])
+
+
+class AsyncReadAPITests(TransactionTestCase):
+    """Test the async read endpoints
+
+    Queries run on other threads, so the data has to be committed.
+    """
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.headers = {'authorization': f'Token {self.token.key}'}
+        self.client = AsyncClient()
+        self.sync_client = APIClient()
+        self.sync_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+        other = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        Tag.objects.create(user=other, name='Hidden')
+        self.other_recipe = Recipe.objects.create(
+            user=other,
+            title='Stew',
+            time_minutes=90,
+            price=12.00
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=30,
+            price=7.50
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice')
+        )
+        Recipe.objects.create(
+            user=self.user,
+            title='Toast',
+            time_minutes=5,
+            price=1.00
+        )
+
+    def tearDown(self):
+        token_cache.clear()
+
+    async def test_login_required(self):
+        """Test that the async endpoints require a valid token"""
+        for url in (ASYNC_TAGS_URL, ASYNC_INGREDIENTS_URL, ASYNC_RECIPES_URL,
+                    async_detail_url(self.recipe.id)):
+            res = await self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = await self.client.get(
+            ASYNC_RECIPES_URL,
+            authorization='Token invalid'
+        )
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_responses_match_sync_endpoints(self):
+        """Test that the async endpoints return what the DRF views return"""
+        for async_url, sync_name in (
+            (ASYNC_TAGS_URL, 'recipe:tag-list'),
+            (ASYNC_INGREDIENTS_URL, 'recipe:ingredient-list'),
+            (ASYNC_RECIPES_URL, 'recipe:recipe-list'),
+        ):
+            res = await self.client.get(async_url, **self.headers)
+            expected = await sync_to_async(self.sync_client.get)(
+                reverse(sync_name)
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.json(), expected.json())
+
+    async def test_list_recipes_query_parameters(self):
+        """Test that the async recipe list filters, selects fields and
+        paginates like the DRF view"""
+        tag = await sync_to_async(Tag.objects.get)(name='Vegan')
+        for params in (
+            {'tags': str(tag.id)},
+            {'search': 'toast'},
+            {'fields': 'id,title'},
+            {'page_size': '1'},
+        ):
+            # The Django 3.2 AsyncClient drops the data of GET requests
+            res = await self.client.get(
+                f'{ASYNC_RECIPES_URL}?{urlencode(params)}',
+                **self.headers
+            )
+            expected = await sync_to_async(self.sync_client.get)(
+                reverse('recipe:recipe-list'), params
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.json()['results'],
+                             expected.json()['results'])
+
+        res = await self.client.get(
+            f'{ASYNC_RECIPES_URL}?page_size=1',
+            **self.headers
+        )
+        res = await self.client.get(res.json()['next'], **self.headers)
+
+        self.assertEqual(
+            [recipe['title'] for recipe in res.json()['results']],
+            ['Curry']
+        )
+
+    async def test_export_recipes(self):
+        """Test that the export streams under ASGI"""
+        res = await self.client.get(
+            reverse('recipe:recipe-export'),
+            **self.headers
+        )
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        res.close()
+        expected = await sync_to_async(lambda: b''.join(
+            self.sync_client.get(
+                reverse('recipe:recipe-export')
+            ).streaming_content
+        ))()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [json.loads(line) for line in expected.splitlines()]
+        )
+        self.assertEqual(len(lines), 2)
+
+    async def test_retrieve_recipe(self):
+        """Test retrieving a recipe in detail"""
+        res = await self.client.get(
+            async_detail_url(self.recipe.id),
+            **self.headers
+        )
+        expected = await sync_to_async(self.sync_client.get)(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), expected.json())
+
+    async def test_retrieve_other_user_recipe_not_found(self):
+        """Test that recipes of other users are not found"""
+        res = await self.client.get(
+            async_detail_url(self.other_recipe.id),
+            **self.headers
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,163 @@
+import datetime
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeLogEntry, CollectionVersion
+from recipe.tests.test_recipe_api import sample_recipe, sample_tag, \
+    detail_url
+
+CHANGES_URL = reverse('recipe:changes')
+
+
+class ChangeLogAPITests(TestCase):
+    """Test the change feed API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def get_changes(self, since=0, **params):
+        return self.client.get(CHANGES_URL, {'since': since, **params})
+
+    def test_login_required(self):
+        """Test that authentication is required for the changes"""
+        res = APIClient().get(CHANGES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_list_changes(self):
+        """Test listing the latest change of each object with its data"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        recipe = sample_recipe(user=self.user, title='Tofu')
+        recipe.tags.add(tag)
+
+        res = self.get_changes()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        changes = res.data['changes']
+        self.assertEqual(
+            [(change['type'], change['id']) for change in changes],
+            [('tag', tag.id), ('recipe', recipe.id)]
+        )
+        self.assertEqual(changes[0]['data'], {'id': tag.id, 'name': 'Vegan'})
+        self.assertEqual(changes[1]['data']['tags'], [tag.id])
+        self.assertEqual(res.data['seq'], changes[-1]['seq'])
+        self.assertIsNone(res.data['next'])
+
+    def test_changes_since(self):
+        """Test that only changes after since are listed"""
+        sample_tag(user=self.user)
+        seq = self.get_changes().data['seq']
+        recipe = sample_recipe(user=self.user)
+
+        res = self.get_changes(seq)
+
+        self.assertEqual(
+            [change['id'] for change in res.data['changes']],
+            [recipe.id]
+        )
+        self.assertEqual(self.get_changes(res.data['seq']).data['changes'],
+                         [])
+
+    def test_deleted_tombstone(self):
+        """Test that deleted objects are listed as tombstones"""
+        recipe = sample_recipe(user=self.user)
+        seq = self.get_changes().data['seq']
+
+        self.client.delete(detail_url(recipe.id))
+        res = self.get_changes(seq)
+
+        self.assertEqual(len(res.data['changes']), 1)
+        change = res.data['changes'][0]
+        self.assertEqual((change['type'], change['id']), ('recipe', recipe.id))
+        self.assertTrue(change['deleted'])
+        self.assertIsNone(change['data'])
+
+    def test_paging(self):
+        """Test following the next links through all changes"""
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(5)]
+
+        res = self.get_changes(page_size=2)
+        ids = [change['id'] for change in res.data['changes']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [change['id'] for change in res.data['changes']]
+
+        self.assertEqual(ids, [tag.id for tag in tags])
+
+    def test_other_user_changes(self):
+        """Test that changes of other users are not listed"""
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        sample_tag(user=user2)
+
+        res = self.get_changes()
+
+        self.assertEqual(res.data['changes'], [])
+
+    def test_compacted_changes_gone(self):
+        """Test that syncing from before compacted tombstones is refused"""
+        recipe = sample_recipe(user=self.user)
+        recipe.delete()
+        ChangeLogEntry.objects.compact(timezone.now())
+        state = CollectionVersion.objects.get(user=self.user)
+
+        res = self.get_changes()
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        self.assertEqual(res.data['seq'], state.version)
+        res = self.get_changes(state.compacted_seq)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['changes'], [])
+
+    def test_compact_superseded(self):
+        """Test compaction keeps only the latest entry of each object"""
+        tag = sample_tag(user=self.user)
+        tag.name = 'Renamed'
+        tag.save()
+        recipe = sample_recipe(user=self.user)
+        recipe_id = recipe.id
+        recipe.delete()
+
+        ChangeLogEntry.objects.compact(
+            timezone.now() - datetime.timedelta(days=1)
+        )
+
+        self.assertEqual(
+            list(ChangeLogEntry.objects.order_by('seq').values_list(
+                'model_name', 'object_id', 'deleted'
+            )),
+            [('tag', tag.id, False), ('recipe', recipe_id, True)]
+        )
+        self.assertEqual(self.get_changes().status_code, status.HTTP_200_OK)
+
+    def test_compact_all_or_nothing(self):
+        """Test a failed compaction of a user keeps its superseded entries
+        along with its tombstones"""
+        tag = sample_tag(user=self.user)
+        tag.name = 'Renamed'
+        tag.save()
+        recipe = sample_recipe(user=self.user)
+        recipe.delete()
+        count = ChangeLogEntry.objects.count()
+
+        with patch('django.db.models.query.QuerySet.update',
+                   side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                ChangeLogEntry.objects.compact(timezone.now())
+
+        self.assertEqual(ChangeLogEntry.objects.count(), count)
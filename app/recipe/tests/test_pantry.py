@@ -0,0 +1,170 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from recipe.pantry import PantryIndex, pantry_indexes
+from recipe.tests.test_recipe_api import sample_recipe, sample_ingredient
+
+COOKABLE_URL = reverse('recipe:recipe-cookable')
+
+
+class PantryIndexTests(TestCase):
+    """Test matching recipes against a pantry"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.rice, self.beans, self.salt = (
+            sample_ingredient(user=self.user, name=name)
+            for name in ('Rice', 'Beans', 'Salt')
+        )
+        self.plain = sample_recipe(user=self.user, title='Plain rice')
+        self.plain.ingredients.add(self.rice)
+        self.stew = sample_recipe(user=self.user, title='Stew')
+        self.stew.ingredients.add(self.rice, self.beans, self.salt)
+
+    def get_index(self):
+        index = PantryIndex(self.user.pk)
+        index.refresh()
+        return index
+
+    def test_match_covered(self):
+        """Test only recipes with all ingredients in the pantry match"""
+        count, matches = self.get_index().match([self.rice.id])
+
+        self.assertEqual(count, 1)
+        self.assertEqual(matches, [(self.plain.id, [])])
+
+    def test_match_missing(self):
+        """Test recipes missing few ingredients match, fewest first"""
+        count, matches = self.get_index().match(
+            [self.rice.id], max_missing=2
+        )
+
+        self.assertEqual(count, 2)
+        self.assertEqual(matches, [
+            (self.plain.id, []),
+            (self.stew.id, sorted([self.beans.id, self.salt.id])),
+        ])
+
+    def test_refresh_applies_changes(self):
+        """Test the index catches up with changes to the recipes"""
+        index = self.get_index()
+        self.plain.ingredients.add(self.salt)
+        self.stew.delete()
+        toast = sample_recipe(user=self.user, title='Toast')
+
+        index.refresh()
+
+        self.assertEqual(
+            index.match([self.rice.id, self.salt.id])[1],
+            [(toast.id, []), (self.plain.id, [])]
+        )
+
+    def test_refresh_reads_only_changed_recipes(self):
+        """Test catching up doesn't reload unchanged recipes"""
+        index = self.get_index()
+        for i in range(4):
+            sample_recipe(user=self.user, title=f'Recipe {i}')
+        index.refresh()
+        self.plain.ingredients.add(self.beans)
+
+        with self.assertNumQueries(3):
+            index.refresh()
+        with self.assertNumQueries(1):
+            index.refresh()
+
+    def test_refresh_reads_one_database(self):
+        """Test all reads of a refresh go to the database routed once"""
+        index = self.get_index()
+        self.plain.ingredients.add(self.beans)
+
+        with patch('recipe.pantry.router.db_for_read',
+                   return_value='default') as db_for_read:
+            index.refresh()
+
+        db_for_read.assert_called_once()
+        self.assertEqual(
+            index.match([self.rice.id, self.beans.id])[1],
+            [(self.plain.id, [])]
+        )
+
+
+class CookableAPITests(TestCase):
+    """Test the pantry matching API"""
+
+    def setUp(self):
+        pantry_indexes.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_cookable(self):
+        """Test listing the recipes the pantry is enough for"""
+        egg = sample_ingredient(user=self.user, name='Egg')
+        milk = sample_ingredient(user=self.user, name='Milk')
+        omelette = sample_recipe(user=self.user, title='Omelette')
+        omelette.ingredients.add(egg)
+        pancakes = sample_recipe(user=self.user, title='Pancakes')
+        pancakes.ingredients.add(egg, milk)
+
+        res = self.client.get(
+            COOKABLE_URL, {'ingredients': egg.id, 'max_missing': 1}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(
+            [(recipe['title'], recipe['missing_ingredients'])
+             for recipe in res.data['results']],
+            [('Omelette', []), ('Pancakes', [milk.id])]
+        )
+
+    def test_list_cookable_other_user(self):
+        """Test that recipes of other users are not matched"""
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        sample_recipe(user=user2)
+
+        res = self.client.get(COOKABLE_URL, {'ingredients': ''})
+
+        self.assertEqual(res.data, {'count': 0, 'next': None, 'results': []})
+
+    def test_list_cookable_paging(self):
+        """Test following the next links through all matching recipes"""
+        egg = sample_ingredient(user=self.user, name='Egg')
+        milk = sample_ingredient(user=self.user, name='Milk')
+        recipes = []
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.ingredients.add(egg, *([milk] if i % 2 else []))
+            recipes.append(recipe)
+
+        res = self.client.get(COOKABLE_URL, {
+            'ingredients': egg.id, 'max_missing': 1, 'page_size': 2
+        })
+        ids = [recipe['id'] for recipe in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            self.assertEqual(res.data['count'], 5)
+            ids += [recipe['id'] for recipe in res.data['results']]
+
+        self.assertEqual(ids, [recipes[i].id for i in (4, 2, 0, 3, 1)])
+
+    def test_list_cookable_invalid_cursor(self):
+        """Test that a malformed cursor is refused"""
+        res = self.client.get(COOKABLE_URL, {'cursor': 'bm90IGpzb24='})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,14 +1,29 @@
+import base64
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipe, Tag, Ingredient
-from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from core.models import Recipe, Tag, Ingredient, ChangeLogEntry
+from recipe.mixins import response_cache
+from recipe.pagination import KeysetPagination
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, \
+    TagSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
+BULK_TAGS_URL = reverse('recipe:recipe-bulk-tags')
+FETCH_URL = reverse('recipe:recipe-fetch')
 
 
 def detail_url(recipe_id):
@@ -16,6 +31,11 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def relation_url(recipe_id, relation):
+    """Return the url changing a relation of a recipe"""
+    return reverse(f'recipe:recipe-{relation}', args=[recipe_id])
+
+
 def sample_tag(user, name='Test tag'):
     """Create and return sample tag"""
     return Tag.objects.create(user=user, name=name)
@@ -37,6 +57,32 @@ def sample_recipe(user, **params):
     return Recipe.objects.create(user=user, **defaults)
 
 
+def sample_recipes_with_relations(user, count, prefix='Sample'):
+    """Create recipes with two tags and two ingredients each"""
+    recipes = []
+    for i in range(count):
+        name = f'{prefix} {i}'
+        recipe = sample_recipe(user=user, title=name)
+        recipe.tags.add(
+            sample_tag(user=user, name=f'{name} tag a'),
+            sample_tag(user=user, name=f'{name} tag b')
+        )
+        recipe.ingredients.add(
+            sample_ingredient(user=user, name=f'{name} ingredient a'),
+            sample_ingredient(user=user, name=f'{name} ingredient b')
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+def count_queries(client, url):
+    """Return the number of queries executed while getting url"""
+    with CaptureQueriesContext(connection) as context:
+        res = client.get(url)
+    assert res.status_code == status.HTTP_200_OK
+    return len(context)
+
+
 class PublicRecipeAPITests(TestCase):
     """Test unauthenticated recipe API tests"""
 
@@ -71,7 +117,52 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_get_recipes_paginated(self):
+        """Test retrieving recipes a page at a time"""
+        recipes = [sample_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[2].id, recipes[1].id]
+        )
+
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [recipes[0].id]
+        )
+        self.assertIsNone(res.data['next'])
+
+    def test_get_recipes_default_page_size(self):
+        """Test that lists are paginated without pagination parameters and
+        page sizes are capped"""
+        for _ in range(3):
+            sample_recipe(user=self.user)
+
+        with patch.object(KeysetPagination, 'page_size', 2), \
+                patch.object(KeysetPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(len(res.data['results']), 2)
+            self.assertIsNotNone(res.data['next'])
+
+            res = self.client.get(RECIPES_URL, {'page_size': 100})
+            self.assertEqual(len(res.data['results']), 2)
+
+    def test_get_recipes_malformed_cursor(self):
+        """Test that cursors with invalid values are rejected"""
+        for position in (['x'], [{'a': 1}], [None]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode())
+
+            res = self.client.get(RECIPES_URL, {'cursor': cursor.decode()})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_getting_limited_to_user(self):
         """Test that only recipes for authenticated user are returned"""
@@ -88,8 +179,8 @@ class PrivateRecipeAPITests(TestCase):
         res = self.client.get(RECIPES_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['title'], recipe.title)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['title'], recipe.title)
 
     def test_view_recipe_detail(self):
         """Test a detailed view of a recipe"""
@@ -193,3 +284,777 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(recipe.title, payload['title'])
         self.assertEqual(recipe.time_minutes, payload['time_minutes'])
         self.assertEqual(tags.count(), 0)
+
+    def test_list_query_count_constant(self):
+        """Test listing recipes costs the same queries regardless of size"""
+        sample_recipes_with_relations(user=self.user, count=1)
+        small = count_queries(self.client, RECIPES_URL)
+        sample_recipes_with_relations(user=self.user, count=10, prefix='Big')
+        large = count_queries(self.client, RECIPES_URL)
+
+        self.assertEqual(small, large)
+        self.assertEqual(large, 4)
+
+    def test_retrieve_query_count_constant(self):
+        """Test retrieving a recipe costs the same queries regardless of
+        the number of related tags and ingredients"""
+        recipe = sample_recipes_with_relations(user=self.user, count=1)[0]
+        small = count_queries(self.client, detail_url(recipe.id))
+        for i in range(10):
+            recipe.tags.add(sample_tag(user=self.user, name=f'Extra {i}'))
+        large = count_queries(self.client, detail_url(recipe.id))
+
+        self.assertEqual(small, large)
+        self.assertEqual(large, 4)
+
+    def test_list_sparse_fields(self):
+        """Test listing only the requested fields without loading relations"""
+        sample_recipes_with_relations(user=self.user, count=3)
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 3)
+        for item in res.data['results']:
+            self.assertEqual(set(item), {'id', 'title'})
+        self.assertEqual(len(context.captured_queries), 2)
+        recipe_query = context.captured_queries[-1]['sql']
+        self.assertNotIn('"price"', recipe_query)
+
+    def test_list_expand_relations(self):
+        """Test nesting the requested relations in a list"""
+        recipe = sample_recipes_with_relations(user=self.user, count=1)[0]
+
+        res = self.client.get(RECIPES_URL, {
+            'fields': 'id,tags,ingredients',
+            'expand': 'tags'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(res.data['results'][0]['tags'], key=lambda tag: tag['id']),
+            TagSerializer(recipe.tags.order_by('id'), many=True).data
+        )
+        self.assertEqual(
+            sorted(res.data['results'][0]['ingredients']),
+            sorted(recipe.ingredients.values_list('id', flat=True))
+        )
+
+    def test_retrieve_without_expansion(self):
+        """Test retrieving a recipe with relations as ids"""
+        recipe = sample_recipes_with_relations(user=self.user, count=1)[0]
+
+        res = self.client.get(detail_url(recipe.id), {
+            'fields': 'title,tags',
+            'expand': ''
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'title': recipe.title,
+            'tags': list(recipe.tags.values_list('id', flat=True))
+        })
+
+    def test_unknown_fields_rejected(self):
+        """Test that unknown fields and relations are rejected"""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {'expand': 'user'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_recipes_by_tags(self):
+        """Test returning recipes with any of the given tags"""
+        recipe1 = sample_recipe(user=self.user, title='Thai curry')
+        recipe2 = sample_recipe(user=self.user, title='Aubergine')
+        recipe3 = sample_recipe(user=self.user, title='Fish and chips')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Vegetarian')
+        recipe1.tags.add(tag1)
+        recipe2.tags.add(tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(ids, [recipe2.id, recipe1.id])
+        self.assertNotIn(recipe3.id, ids)
+
+    def test_filter_recipes_matching_all(self):
+        """Test returning recipes with all of the given tags and
+        ingredients"""
+        recipe1 = sample_recipe(user=self.user, title='Thai curry')
+        recipe2 = sample_recipe(user=self.user, title='Aubergine')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Spicy')
+        ingredient = sample_ingredient(user=self.user, name='Rice')
+        recipe1.tags.add(tag1, tag2)
+        recipe1.ingredients.add(ingredient)
+        recipe2.tags.add(tag1)
+        recipe2.ingredients.add(ingredient)
+
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {
+                'tags': f'{tag1.id},{tag2.id}',
+                'ingredients': f'{ingredient.id}',
+                'match': 'all'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']], [recipe1.id]
+        )
+
+    def test_filter_recipes_by_ingredients(self):
+        """Test returning recipes with any of the given ingredients"""
+        recipe1 = sample_recipe(user=self.user, title='Posh beans on toast')
+        recipe2 = sample_recipe(user=self.user, title='Chicken cacciatore')
+        ingredient = sample_ingredient(user=self.user, name='Feta cheese')
+        recipe1.ingredients.add(ingredient)
+
+        res = self.client.get(RECIPES_URL, {'ingredients': ingredient.id})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertIn(recipe1.id, ids)
+        self.assertNotIn(recipe2.id, ids)
+
+    def test_filter_recipes_invalid_ids(self):
+        """Test that filtering with invalid ids fails"""
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        """Test searching recipes by title, tag and ingredient names"""
+        curry = sample_recipe(user=self.user, title='Thai green curry')
+        salad = sample_recipe(user=self.user, title='Summer salad')
+        toast = sample_recipe(user=self.user, title='Beans on toast')
+        salad.tags.add(sample_tag(user=self.user, name='Vegetarian'))
+        toast.ingredients.add(sample_ingredient(user=self.user, name='Beans'))
+
+        for term, expected in (('curry', curry), ('vegetarian', salad),
+                               ('beans toast', toast)):
+            res = self.client.get(RECIPES_URL, {'search': term})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                [recipe['id'] for recipe in res.data['results']], [expected.id]
+            )
+
+    def test_search_recipes_no_match(self):
+        """Test that searching without matches returns no recipes"""
+        sample_recipe(user=self.user, title='Thai green curry')
+
+        res = self.client.get(RECIPES_URL, {'search': 'pancakes'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+    def test_search_recipes_ranked(self):
+        """Test that title matches rank above tag matches"""
+        tagged = sample_recipe(user=self.user, title='Weeknight dinner')
+        tagged.tags.add(sample_tag(user=self.user, name='Curry'))
+        titled = sample_recipe(user=self.user, title='Curry')
+        sample_recipe(user=self.user, title='Pancakes')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        self.assertEqual(
+            [recipe['id'] for recipe in res.data['results']],
+            [titled.id, tagged.id]
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Requires PostgreSQL')
+    def test_search_recipes_paginated(self):
+        """Test paging through equally ranked search results"""
+        recipes = [sample_recipe(user=self.user, title=f'Curry {i}')
+                   for i in range(5)]
+
+        ids = []
+        res = self.client.get(RECIPES_URL, {'search': 'curry', 'page_size': 2})
+        while True:
+            ids += [recipe['id'] for recipe in res.data['results']]
+            if res.data['next'] is None:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_export_recipes(self):
+        """Test streaming the recipes of the user as NDJSON"""
+        recipes = sample_recipes_with_relations(user=self.user, count=3)
+        user2 = get_user_model().objects.create_user(
+            email='new@mkznd.com',
+            password='password'
+        )
+        sample_recipe(user=user2)
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        expected = RecipeDetailSerializer(recipes, many=True).data
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            json.loads(json.dumps(expected))
+        )
+
+    def test_export_recipes_accept_json(self):
+        """Test that clients accepting JSON get the NDJSON export"""
+        sample_recipe(user=self.user)
+
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT='application/json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(b''.join(res.streaming_content).splitlines()), 1)
+
+    def test_list_not_modified(self):
+        """Test that an unchanged list is answered with 304"""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_modified_after_write(self):
+        """Test that writes to the collection change the ETag"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        recipe.tags.add(sample_tag(user=self.user))
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_retrieve_not_modified(self):
+        """Test that an unchanged recipe is answered with 304"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.get(detail_url(recipe.id))
+
+        res = self.client.get(
+            detail_url(recipe.id),
+            HTTP_IF_NONE_MATCH=res['ETag']
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_modified_within_second(self):
+        """Test that a date alone never gets a 304 response"""
+        recipe = sample_recipe(user=self.user)
+        res = self.client.get(detail_url(recipe.id))
+        self.assertNotIn('Last-Modified', res)
+
+        recipe.title = 'Changed'
+        recipe.save()
+        res = self.client.get(
+            detail_url(recipe.id),
+            HTTP_IF_MODIFIED_SINCE=http_date()
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Changed')
+
+    def test_retrieve_deleted_not_found(self):
+        """Test that a deleted recipe is a 404 even for a matching ETag"""
+        recipe = sample_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        self.client.get(url)
+        recipe.delete()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_served_from_cache(self):
+        """Test that an unchanged list is served from the response cache"""
+        sample_recipe(user=self.user)
+        hits = response_cache.stats()['hits']
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, res.content)
+        self.assertEqual(response_cache.stats()['hits'], hits + 1)
+
+    def test_list_cache_invalidated_by_writes(self):
+        """Test that updates and relation changes invalidate the cache"""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(detail_url(recipe.id), {'title': 'Chicken'})
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['title'], 'Chicken')
+
+        tag = sample_tag(user=self.user)
+        self.client.get(RECIPES_URL)
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['tags'], [tag.id])
+
+
+class BulkRecipeAPITests(TestCase):
+    """Test the bulk recipe API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.tag = sample_tag(user=self.user, name='Vegan')
+        self.ingredient = sample_ingredient(user=self.user, name='Tofu')
+
+    def test_bulk_create_recipes(self):
+        """Test creating many recipes with their relations"""
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 5,
+                'price': '5.00',
+                'tags': [self.tag.id],
+                'ingredients': [self.ingredient.id]
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2']
+        )
+        for recipe in Recipe.objects.filter(user=self.user):
+            self.assertEqual(list(recipe.tags.all()), [self.tag])
+            self.assertEqual(
+                list(recipe.ingredients.all()), [self.ingredient]
+            )
+
+    def test_bulk_create_resolves_related_once(self):
+        """Test that related ids are validated with one query per model"""
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 5,
+                'price': '5.00',
+                'tags': [self.tag.id],
+                'ingredients': [self.ingredient.id]
+            }
+            for i in range(10)
+        ]
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(BULK_URL, payload, format='json')
+
+        lookups = [query for query in context.captured_queries
+                   if 'FROM "core_tag" WHERE' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+
+    def test_create_resolves_related_in_one_query(self):
+        """Test that all submitted ingredients are looked up at once"""
+        ingredients = [sample_ingredient(user=self.user, name=f'Item {i}')
+                       for i in range(40)]
+        payload = {
+            'title': 'Stew',
+            'time_minutes': 60,
+            'price': '12.00',
+            'tags': [],
+            'ingredients': [ingredient.id for ingredient in ingredients]
+        }
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        lookups = [query for query in context.captured_queries
+                   if 'FROM "core_ingredient" WHERE' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(len(res.data['ingredients']), 40)
+
+    def test_create_with_other_user_tag(self):
+        """Test that tags of other users are rejected"""
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        tag = sample_tag(user=user2, name='Theirs')
+        payload = {
+            'title': 'Toast',
+            'time_minutes': 2,
+            'price': '1.00',
+            'tags': [self.tag.id, tag.id],
+            'ingredients': []
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('does not exist', str(res.data['tags'][0]))
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_reports_item_errors(self):
+        """Test that invalid items are reported and nothing is created"""
+        payload = [
+            {'title': 'Valid', 'time_minutes': 5, 'price': '5.00',
+             'tags': [], 'ingredients': []},
+            {'title': 'Invalid', 'time_minutes': 5, 'price': '5.00',
+             'tags': [0], 'ingredients': []},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('tags', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update_recipes(self):
+        """Test updating many recipes at once"""
+        recipe1 = sample_recipe(user=self.user, title='Old 1')
+        recipe2 = sample_recipe(user=self.user, title='Old 2')
+        recipe2.tags.add(sample_tag(user=self.user, name='Old tag'))
+        payload = [
+            {'id': recipe1.id, 'title': 'New 1'},
+            {'id': recipe2.id, 'tags': [self.tag.id]},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe1.title, 'New 1')
+        self.assertEqual(recipe2.title, 'Old 2')
+        self.assertEqual(list(recipe2.tags.all()), [self.tag])
+
+    def test_bulk_update_sets_updated_at(self):
+        """Test that bulk updates mark recipes as updated"""
+        recipe1 = sample_recipe(user=self.user, title='Old 1')
+        recipe2 = sample_recipe(user=self.user, title='Old 2')
+        before = [recipe1.updated_at, recipe2.updated_at]
+        payload = [
+            {'id': recipe1.id, 'title': 'New 1'},
+            {'id': recipe2.id, 'tags': [self.tag.id]},
+        ]
+
+        self.client.patch(BULK_URL, payload, format='json')
+
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertGreater(recipe1.updated_at, before[0])
+        self.assertGreater(recipe2.updated_at, before[1])
+
+    def test_bulk_create_sets_ids(self):
+        """Test that bulk created recipes get the ids of their rows"""
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '5.00',
+             'tags': [], 'ingredients': []}
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(
+            [Recipe.objects.get(pk=recipe['id']).title
+             for recipe in res.data],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2']
+        )
+
+    def test_bulk_update_other_user_recipe(self):
+        """Test that recipes of other users cannot be updated"""
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        recipe = sample_recipe(user=user2, title='Theirs')
+
+        res = self.client.patch(
+            BULK_URL, [{'id': recipe.id, 'title': 'Mine'}], format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Theirs')
+
+    def test_bulk_update_duplicate_ids(self):
+        """Test that an item per recipe is required"""
+        recipe = sample_recipe(user=self.user, title='Old')
+        payload = [
+            {'id': recipe.id, 'title': 'First'},
+            {'id': recipe.id, 'title': 'Second'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('id', res.data[1])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Old')
+
+    def test_bulk_create_logs_each_recipe_once(self):
+        """Test bulk inserts log one change per recipe without signals"""
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '5.00',
+             'tags': [self.tag.id], 'ingredients': []}
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(
+            sorted(ChangeLogEntry.objects.filter(
+                model_name='recipe'
+            ).values_list('object_id', flat=True)),
+            sorted(recipe['id'] for recipe in res.data)
+        )
+
+    def test_bulk_delete_recipes(self):
+        """Test deleting many recipes at once"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        kept = sample_recipe(user=self.user)
+
+        res = self.client.delete(
+            BULK_URL, {'ids': [recipe1.id, recipe2.id, 0]}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['deleted'], [recipe1.id, recipe2.id])
+        self.assertEqual(res.data['missing'], [0])
+        self.assertEqual(list(Recipe.objects.all()), [kept])
+
+
+class RecipeRelationAPITests(TestCase):
+    """Test adding and removing relations of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.recipe = sample_recipe(user=self.user)
+        self.tag1 = sample_tag(user=self.user, name='Vegan')
+        self.tag2 = sample_tag(user=self.user, name='Dessert')
+
+    def test_add_tags(self):
+        """Test adding tags keeps the existing ones"""
+        self.recipe.tags.add(self.tag1)
+
+        res = self.client.post(
+            relation_url(self.recipe.id, 'tags'),
+            {'tags': [self.tag1.id, self.tag2.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'], [self.tag1.id, self.tag2.id])
+        self.assertEqual(self.recipe.tags.count(), 2)
+
+    def test_remove_ingredients(self):
+        """Test removing ingredients leaves the others linked"""
+        ingredient1 = sample_ingredient(user=self.user, name='Salt')
+        ingredient2 = sample_ingredient(user=self.user, name='Pepper')
+        self.recipe.ingredients.add(ingredient1, ingredient2)
+
+        res = self.client.delete(
+            relation_url(self.recipe.id, 'ingredients'),
+            {'ingredients': [ingredient1.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['ingredients'], [ingredient2.id])
+
+    def test_add_tag_invalidates_detail(self):
+        """Test a change is visible to a conditional detail request"""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.post(
+            relation_url(self.recipe.id, 'tags'),
+            {'tags': [self.tag1.id]},
+            format='json'
+        )
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['id'], self.tag1.id)
+
+    def test_add_other_user_tag(self):
+        """Test that tags of other users cannot be added"""
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        tag = sample_tag(user=user2, name='Theirs')
+
+        res = self.client.post(
+            relation_url(self.recipe.id, 'tags'),
+            {'tags': [tag.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.recipe.tags.exists())
+
+    def test_change_other_user_recipe(self):
+        """Test that relations of other users recipes cannot be changed"""
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        recipe = sample_recipe(user=user2)
+
+        res = self.client.post(
+            relation_url(recipe.id, 'tags'),
+            {'tags': [self.tag1.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(recipe.tags.exists())
+
+    def test_add_tags_does_not_read_relation(self):
+        """Test adding tags doesn't read the current tags of the recipe"""
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(
+                relation_url(self.recipe.id, 'tags'),
+                {'tags': [self.tag1.id]},
+                format='json'
+            )
+
+        reads = [query for query in context.captured_queries
+                 if query['sql'].startswith('SELECT') and
+                 'FROM "core_recipe_tags"' in query['sql']]
+        self.assertEqual(len(reads), 1)
+
+    def test_bulk_add_tag(self):
+        """Test adding a tag to many recipes at once"""
+        recipe2 = sample_recipe(user=self.user)
+        recipe2.tags.add(self.tag1)
+
+        res = self.client.post(
+            BULK_TAGS_URL,
+            {'recipes': [self.recipe.id, recipe2.id, 0],
+             'tags': [self.tag1.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['updated'], [self.recipe.id, recipe2.id])
+        self.assertEqual(res.data['missing'], [0])
+        self.assertEqual(self.tag1.recipe_set.count(), 2)
+
+    def test_bulk_remove_tag(self):
+        """Test removing a tag from many recipes at once"""
+        recipe2 = sample_recipe(user=self.user)
+        for recipe in (self.recipe, recipe2):
+            recipe.tags.add(self.tag1, self.tag2)
+
+        res = self.client.delete(
+            BULK_TAGS_URL,
+            {'recipes': [self.recipe.id, recipe2.id],
+             'tags': [self.tag1.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(self.tag1.recipe_set.exists())
+        self.assertEqual(self.tag2.recipe_set.count(), 2)
+
+
+class MultiGetRecipeAPITests(TestCase):
+    """Test fetching many recipes by id"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_get_recipes_by_id(self):
+        """Test recipes are returned as in detail in the requested order"""
+        recipe1, recipe2 = sample_recipes_with_relations(
+            user=self.user, count=2
+        )
+        user2 = get_user_model().objects.create_user(
+            email='other@mkznd.com',
+            password='password'
+        )
+        other = sample_recipe(user=user2)
+
+        res = self.client.get(RECIPES_URL, {
+            'ids': f'{recipe2.id},{other.id},{recipe1.id},0'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = RecipeDetailSerializer(
+            Recipe.objects.with_related().filter(
+                pk__in=[recipe1.id, recipe2.id]
+            ).order_by('-id'),
+            many=True
+        ).data
+        self.assertEqual(res.data['results'], expected)
+        self.assertEqual(res.data['missing'], [other.id, 0])
+
+    def test_get_recipes_by_id_query_count_constant(self):
+        """Test the number of queries doesn't grow with the ids"""
+        recipes = sample_recipes_with_relations(user=self.user, count=10)
+
+        small = count_queries(
+            self.client, f'{RECIPES_URL}?ids={recipes[0].id}'
+        )
+        large = count_queries(self.client, '{}?ids={}'.format(
+            RECIPES_URL, ','.join(str(recipe.id) for recipe in recipes)
+        ))
+
+        self.assertEqual(small, large)
+
+    def test_fetch_recipes_by_id(self):
+        """Test fetching recipes with the ids in the request body"""
+        recipe1 = sample_recipe(user=self.user, title='First')
+        recipe2 = sample_recipe(user=self.user, title='Second')
+
+        res = self.client.post(
+            FETCH_URL, {'ids': [recipe1.id, 0, recipe2.id]}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data['results']],
+            ['First', 'Second']
+        )
+        self.assertEqual(res.data['missing'], [0])
+
+    def test_get_recipes_by_id_sparse(self):
+        """Test selecting the fields of recipes fetched by id"""
+        recipe = sample_recipes_with_relations(user=self.user, count=1)[0]
+
+        res = self.client.get(RECIPES_URL, {
+            'ids': recipe.id, 'fields': 'id,tags', 'expand': ''
+        })
+
+        self.assertEqual(res.data['results'], [{
+            'id': recipe.id,
+            'tags': sorted(tag.id for tag in recipe.tags.all())
+        }])
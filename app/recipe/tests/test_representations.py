@@ -0,0 +1,110 @@
+import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe
+from core.renderers import FastJSONRenderer
+from recipe import representations
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.tests.test_recipe_api import sample_recipes_with_relations
+
+
+class RecipeRepresentationTests(TestCase):
+    """Test representing recipes from values() rows"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@mkznd.com',
+            password='password'
+        )
+        sample_recipes_with_relations(user=self.user, count=3)
+        Recipe.objects.create(
+            user=self.user,
+            title='Plain   toast',
+            time_minutes=2,
+            price=Decimal('0.5')
+        )
+        self.queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+
+    def represent(self, fields=None, expand=()):
+        rows = list(representations.values_queryset(
+            self.queryset, fields, expand
+        ))
+        return JSONRenderer().render(
+            representations.represent_recipes(rows, fields, expand)
+        )
+
+    def test_matches_serializer(self):
+        """Test the output is byte for byte that of the serializer"""
+        expected = JSONRenderer().render(RecipeSerializer(
+            self.queryset.with_related_ids(),
+            many=True
+        ).data)
+
+        self.assertEqual(self.represent(), expected)
+
+    def test_matches_detail_serializer(self):
+        """Test expanded output is byte for byte that of the detail
+        serializer"""
+        expected = JSONRenderer().render(RecipeDetailSerializer(
+            self.queryset.with_related(),
+            many=True
+        ).data)
+
+        self.assertEqual(
+            self.represent(expand=('tags', 'ingredients')),
+            expected
+        )
+
+    def test_matches_sparse_fields(self):
+        """Test output for a subset of fields matches the serializer"""
+        fields = ['title', 'price', 'tags']
+        expected = JSONRenderer().render(RecipeSerializer(
+            self.queryset.with_related_ids(),
+            many=True,
+            context={'fields': fields, 'expand': []}
+        ).data)
+
+        self.assertEqual(self.represent(fields=fields), expected)
+
+    def test_no_relations_queried_when_not_selected(self):
+        """Test that relations left out of the fields are not queried"""
+        queryset = representations.values_queryset(
+            self.queryset, ['id', 'title']
+        )
+
+        with self.assertNumQueries(1):
+            representations.represent_recipes(
+                list(queryset), ['id', 'title']
+            )
+
+
+class FastJSONRendererTests(TestCase):
+    """Test the orjson renderer"""
+
+    data = {
+        'text': 'Crème brûlée    "quoted"',
+        'price': Decimal('5.50'),
+        'when': datetime.datetime(2021, 6, 1, 12, 30, 15, 123456,
+                                  tzinfo=datetime.timezone.utc),
+        'nested': [{'id': 1, 'tags': []}, None, True],
+    }
+
+    def test_matches_json_renderer(self):
+        """Test the output is byte for byte that of JSONRenderer"""
+        self.assertEqual(
+            FastJSONRenderer().render(self.data),
+            JSONRenderer().render(self.data)
+        )
+
+    def test_without_orjson(self):
+        """Test falling back to JSONRenderer without orjson"""
+        with patch('core.renderers.orjson', None):
+            self.assertEqual(
+                FastJSONRenderer().render(self.data),
+                JSONRenderer().render(self.data)
+            )
@@ -1,3 +1,6 @@
+import base64
+import json
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -5,7 +8,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Tag, Recipe
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
@@ -47,7 +50,7 @@ class PrivateTagsAPITests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test that tags returned are for the authenticated user only"""
@@ -61,8 +64,8 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_create_tag(self):
         """Test creating a new tag"""
@@ -82,3 +85,70 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.post(TAGS_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_paginated_with_stable_order(self):
+        """Test paging through tags with duplicate names"""
+        for name in ('Vegan', 'Meat', 'Meat', 'Meat', 'Fish'):
+            Tag.objects.create(user=self.user, name=name)
+        expected = TagSerializer(
+            Tag.objects.all().order_by('-name', '-id'), many=True
+        ).data
+
+        results = []
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            results.extend(res.data['results'])
+            if res.data['next'] is None:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(results, expected)
+
+    def test_tags_invalid_cursor(self):
+        """Test that an invalid cursor is rejected"""
+        res = self.client.get(TAGS_URL, {'cursor': 'invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_malformed_cursor_values(self):
+        """Test that cursors with values of the wrong type are rejected"""
+        for position in (['x', 'y'], ['x', None], ['x', {'a': 1}]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode())
+
+            res = self.client.get(TAGS_URL, {'cursor': cursor.decode()})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve_tags_assigned_to_recipes(self):
+        """Test filtering tags by those assigned to recipes"""
+        tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+        tag2 = Tag.objects.create(user=self.user, name='Lunch')
+        recipe = Recipe.objects.create(
+            title='Coriander eggs on toast',
+            time_minutes=10,
+            price=5.00,
+            user=self.user
+        )
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertIn(tag1.name, names)
+        self.assertNotIn(tag2.name, names)
+
+    def test_tags_not_modified_until_write(self):
+        """Test that the tag list is answered with 304 until a tag is
+        created"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(TAGS_URL, {'name': 'Dessert'})
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from recipe import views
+from recipe import async_views, views
 
 router = DefaultRouter()
 router.register('tags', views.TagViewSet)
@@ -11,5 +11,18 @@ router.register('recipes', views.RecipeViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    path('changes/', views.ChangeLogView.as_view(), name='changes'),
+    path('async/tags/', async_views.tag_list, name='async-tag-list'),
+    path(
+        'async/ingredients/',
+        async_views.ingredient_list,
+        name='async-ingredient-list'
+    ),
+    path('async/recipes/', async_views.recipe_list, name='async-recipe-list'),
+    path(
+        'async/recipes/<int:pk>/',
+        async_views.recipe_detail,
+        name='async-recipe-detail'
+    ),
 ]
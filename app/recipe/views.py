@@ -1,23 +1,121 @@
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
+import base64
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework import viewsets, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from core.authentication import CachedTokenAuthentication
+from core.models import Tag, Ingredient, Recipe, CollectionVersion, \
+    ChangeLogEntry
+from recipe import representations, serializers
+from recipe.export import ExportContentNegotiation, NDJSONRenderer, \
+    export_recipes, spool
+from recipe.mixins import CachedListMixin, ConditionalResponseMixin, \
+    ValuesListMixin
+from recipe.pagination import KeysetPagination
+from recipe.pantry import pantry_indexes
+
+
+def params_to_ints(request, name):
+    """Convert a comma separated query parameter to a list of integers"""
+    value = request.query_params.get(name)
+    if not value:
+        return []
+    try:
+        return [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        raise ValidationError({name: 'Expected comma separated ids.'})
+
+
+def param_to_int(request, name, default=None):
+    """Return a non-negative integer query parameter"""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise ValidationError({name: 'Expected a non-negative integer.'})
+    return number
+
 
-from core.models import Tag, Ingredient, Recipe
-from recipe import serializers
+def cursor_to_ints(request, name, length):
+    """Return the integers in a cursor query parameter encoded like the
+    ones of KeysetPagination, if any"""
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(value))
+    except (TypeError, ValueError):
+        position = None
+    if not isinstance(position, list) or len(position) != length or \
+            not all(type(number) is int for number in position):
+        raise NotFound(KeysetPagination.invalid_cursor_message)
+    return position
 
 
-class BaseRecipeAttributeViewSet(viewsets.GenericViewSet,
+def params_to_names(request, name, choices):
+    """Return the names in a comma separated query parameter, checking
+    each is one of the choices"""
+    value = request.query_params.get(name)
+    if not value:
+        return []
+    names = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in names if item not in choices]
+    if unknown:
+        raise ValidationError(
+            {name: 'Unknown names: {}.'.format(', '.join(unknown))}
+        )
+    return names
+
+
+def data_to_ints(request, name):
+    """Return a list of integers from the request body"""
+    values = request.data.get(name) if isinstance(request.data, dict) \
+        else None
+    if not isinstance(values, list) or \
+            not all(isinstance(value, int) for value in values):
+        raise ValidationError({name: 'Expected a list of ids.'})
+    return values
+
+
+class BaseRecipeAttributeViewSet(ConditionalResponseMixin,
+                                 CachedListMixin,
+                                 viewsets.GenericViewSet,
                                  mixins.ListModelMixin,
                                  mixins.CreateModelMixin):
     """Base class for tags and ingredients"""
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    ordering = ('-name', '-id')
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.request.query_params.get('assigned_only') == '1':
+            field = Recipe._meta.get_field(self.recipe_relation)
+            assigned = field.remote_field.through.objects.filter(**{
+                field.m2m_reverse_field_name(): OuterRef('pk')
+            })
+            queryset = queryset.filter(Exists(assigned))
+        return queryset.order_by(*self.ordering)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         """Create a new object"""
         serializer.save(user=self.request.user)
@@ -28,6 +126,7 @@ class TagViewSet(BaseRecipeAttributeViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    recipe_relation = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttributeViewSet, mixins.DestroyModelMixin):
@@ -35,19 +134,201 @@ class IngredientViewSet(BaseRecipeAttributeViewSet, mixins.DestroyModelMixin):
 
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_relation = 'ingredients'
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ConditionalResponseMixin,
+                    CachedListMixin,
+                    ValuesListMixin,
+                    viewsets.ModelViewSet):
     """Manage recipes in the database"""
 
     serializer_class = serializers.RecipeSerializer
-    queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    queryset = Recipe.objects.defer('search_vector')
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    ordering = ('-id',)
+    bulk_max_size = 1000
+    export_chunk_size = 1000
+    expandable = ('tags', 'ingredients')
 
     def get_queryset(self):
         """Retrieve the recipes for the authenticated user"""
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset.filter(
+            user=self.request.user
+        ).order_by(*self.ordering)
+        if self.action == 'list':
+            queryset = self.filter_related(queryset)
+            term = self.request.query_params.get('search', '').strip()
+            if term:
+                queryset = queryset.search(term)
+        if self.action not in ('list', 'retrieve'):
+            return queryset.with_related_ids()
+
+        fields, expand = self.get_field_selection()
+        relations = [relation for relation in self.expandable
+                     if fields is None or relation in fields]
+        if fields is not None:
+            queryset = queryset.only('id', *(
+                name for name in fields if name not in self.expandable
+            ))
+        return queryset.with_related(
+            [relation for relation in relations if relation in expand]
+        ).with_related_ids(
+            [relation for relation in relations if relation not in expand]
+        )
+
+    def get_field_selection(self):
+        """Return the fields requested with ?fields=, or None for all of
+        them, and the relations to nest requested with ?expand=
+
+        Relations are nested in detail and in recipes fetched by id unless
+        ?expand= is given.
+        """
+        fields = params_to_names(
+            self.request,
+            'fields',
+            serializers.RecipeSerializer.Meta.fields
+        ) or None
+        detail = self.action in ('retrieve', 'fetch') or \
+            'ids' in self.request.query_params
+        if detail and 'expand' not in self.request.query_params:
+            expand = list(self.expandable)
+        else:
+            expand = params_to_names(self.request, 'expand', self.expandable)
+        return fields, expand
+
+    def get_values_queryset(self):
+        """Return the rows of the listed recipes"""
+        fields, expand = self.get_field_selection()
+        return representations.values_queryset(
+            self.get_queryset(), fields, expand
+        )
+
+    def represent_rows(self, rows):
+        """Return the representations of listed rows"""
+        fields, expand = self.get_field_selection()
+        return representations.represent_recipes(rows, fields, expand)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['fields'], context['expand'] = self.get_field_selection()
+        context['resolved_objects'] = self.get_resolved_objects()
+        return context
+
+    def get_resolved_objects(self):
+        """Return the related objects resolved by the serializers of this
+        request"""
+        if not hasattr(self, '_resolved_objects'):
+            self._resolved_objects = {}
+        return self._resolved_objects
+
+    def filter_related(self, queryset):
+        """Filter recipes by the tags and ingredients query parameters"""
+        match_all = self.request.query_params.get('match') == 'all'
+        for relation in ('tags', 'ingredients'):
+            ids = params_to_ints(self.request, relation)
+            if not ids:
+                continue
+            if match_all:
+                queryset = queryset.with_all_related(relation, ids)
+            else:
+                queryset = queryset.with_any_related(relation, ids)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if 'ids' in request.query_params:
+            return self.conditional_response(self.list_many, request)
+        return super().list(request, *args, **kwargs)
+
+    def list_many(self, request):
+        """Return the recipes with the ids in ?ids="""
+        return self.get_many(params_to_ints(request, 'ids'))
+
+    @action(detail=False, methods=['post'])
+    def fetch(self, request):
+        """Return the recipes with the ids in the request body"""
+        return self.get_many(data_to_ints(request, 'ids'))
+
+    def get_many(self, ids):
+        """Return the recipes with the ids in their order, shaped as in
+        detail, and the ids of the missing ones"""
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > self.bulk_max_size:
+            raise ValidationError({'ids': [
+                f'Expected at most {self.bulk_max_size} ids.'
+            ]})
+        found = self.represent_ids(ids)
+        return Response({
+            'results': [found[pk] for pk in ids if pk in found],
+            'missing': [pk for pk in ids if pk not in found]
+        })
+
+    def represent_ids(self, ids):
+        """Return the representations of the recipes with the ids found
+        for the user, by id"""
+        fields, expand = self.get_field_selection()
+        rows = list(representations.values_queryset(
+            self.queryset.filter(user=self.request.user, pk__in=ids),
+            fields,
+            expand
+        ))
+        return dict(zip(
+            (row['id'] for row in rows),
+            representations.represent_recipes(rows, fields, expand)
+        ))
+
+    @action(detail=False, methods=['get'])
+    def cookable(self, request):
+        """List the recipes that the ingredients in ?ingredients= are
+        enough for, or that miss at most ?max_missing= ingredients"""
+        return self.conditional_response(self.list_cookable, request)
+
+    def list_cookable(self, request):
+        """Return a page of the recipes matching the pantry in the query
+        string with the ids of their missing ingredients
+
+        The next link resumes after the missing count and id of the last
+        recipe of the page.
+        """
+        ingredient_ids = params_to_ints(request, 'ingredients')
+        max_missing = param_to_int(request, 'max_missing', 0)
+        paginator = self.pagination_class()
+        page_size = paginator.get_page_size(request) or paginator.page_size
+        after = cursor_to_ints(request, paginator.cursor_query_param, 2)
+        count, matches = pantry_indexes.get(request.user.pk).match(
+            ingredient_ids,
+            max_missing,
+            page_size + 1,
+            after
+        )
+        next_link = None
+        if len(matches) > page_size:
+            matches = matches[:page_size]
+            pk, missing = matches[-1]
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                paginator.cursor_query_param,
+                paginator.encode_cursor([len(missing), pk])
+            )
+        found = self.represent_ids([pk for pk, _ in matches])
+        return Response({
+            'count': count,
+            'next': next_link,
+            'results': [dict(found[pk], missing_ingredients=missing)
+                        for pk, missing in matches if pk in found]
+        })
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -55,6 +336,256 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeDetailSerializer
         return self.serializer_class
 
+    @transaction.atomic
     def perform_create(self, serializer):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """Create, update or delete many recipes in a single request"""
+        if request.method == 'DELETE':
+            return self.bulk_destroy(request)
+        if not isinstance(request.data, list):
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Expected a list of items.'
+            ]})
+        if len(request.data) > self.bulk_max_size:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                f'Expected at most {self.bulk_max_size} items.'
+            ]})
+
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data, many=True)
+            serializer.is_valid(raise_exception=True)
+            recipes = serializer.save(user=request.user)
+            status_code = status.HTTP_201_CREATED
+        else:
+            serializer = self.get_serializer(
+                self.get_bulk_instances(request.data),
+                data=request.data,
+                many=True,
+                partial=True
+            )
+            serializer.is_valid(raise_exception=True)
+            recipes = serializer.save()
+            status_code = status.HTTP_200_OK
+
+        ids = [recipe.pk for recipe in recipes]
+        fetched = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [fetched[pk] for pk in ids],
+            many=True
+        )
+        return Response(serializer.data, status=status_code)
+
+    def get_bulk_instances(self, data):
+        """Return the recipes updated by the items, in the same order"""
+        ids = [item.get('id') if isinstance(item, dict) else None
+               for item in data]
+        recipes = self.get_queryset().in_bulk(
+            [pk for pk in ids if isinstance(pk, int)]
+        )
+        seen = set()
+        errors = []
+        for pk in ids:
+            if not isinstance(pk, int) or pk not in recipes:
+                errors.append({'id': ['Recipe not found.']})
+            elif pk in seen:
+                errors.append({'id': ['Duplicate id.']})
+            else:
+                errors.append({})
+            seen.add(pk)
+        if any(errors):
+            raise ValidationError(errors)
+        return [recipes[pk] for pk in ids]
+
+    def bulk_destroy(self, request):
+        """Delete the recipes with the ids given in the request body"""
+        ids = data_to_ints(request, 'ids')
+        queryset = self.get_queryset().filter(pk__in=ids)
+        found = set(queryset.values_list('pk', flat=True))
+        queryset.delete()
+        return Response({
+            'deleted': [pk for pk in ids if pk in found],
+            'missing': [pk for pk in ids if pk not in found]
+        })
+
+    @action(detail=True, methods=['post', 'delete'])
+    def tags(self, request, pk=None):
+        """Add or remove tags of a recipe"""
+        return self.change_related(request, 'tags', pk)
+
+    @action(detail=True, methods=['post', 'delete'])
+    def ingredients(self, request, pk=None):
+        """Add or remove ingredients of a recipe"""
+        return self.change_related(request, 'ingredients', pk)
+
+    @action(detail=False, methods=['post', 'delete'], url_path='bulk/tags')
+    def bulk_tags(self, request):
+        """Add or remove tags of many recipes"""
+        return self.bulk_change_related(request, 'tags')
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='bulk/ingredients')
+    def bulk_ingredients(self, request):
+        """Add or remove ingredients of many recipes"""
+        return self.bulk_change_related(request, 'ingredients')
+
+    def get_related_ids(self, request, relation):
+        """Return the ids of the related objects in the request body,
+        checking they belong to the user"""
+        field = self.get_serializer().fields[relation]
+        value = request.data.get(relation) \
+            if isinstance(request.data, dict) else None
+        try:
+            objects = field.run_validation(value)
+        except ValidationError as exc:
+            raise ValidationError({relation: exc.detail})
+        return list(dict.fromkeys(obj.pk for obj in objects))
+
+    def apply_related_change(self, request, relation, queryset):
+        """Link or unlink the related ids in the request body to the
+        recipes of the queryset and return the ids of the recipes"""
+        ids = self.get_related_ids(request, relation)
+        if request.method == 'DELETE':
+            return queryset.remove_related(relation, ids)
+        return queryset.add_related(relation, ids)
+
+    def change_related(self, request, relation, pk):
+        """Apply a change to the relation of one recipe and return its
+        related ids"""
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound()
+        queryset = self.queryset.filter(user=request.user, pk=pk)
+        if not self.apply_related_change(request, relation, queryset):
+            raise NotFound()
+        related_ids = representations.fetch_related_ids([{'id': pk}], relation)
+        return Response({relation: related_ids[pk]})
+
+    def bulk_change_related(self, request, relation):
+        """Apply a change to the relation of the recipes in the request
+        body"""
+        ids = data_to_ints(request, 'recipes')
+        if len(ids) > self.bulk_max_size:
+            raise ValidationError({'recipes': [
+                f'Expected at most {self.bulk_max_size} items.'
+            ]})
+        changed = set(self.apply_related_change(
+            request,
+            relation,
+            self.queryset.filter(user=request.user, pk__in=ids)
+        ))
+        return Response({
+            'updated': [pk for pk in ids if pk in changed],
+            'missing': [pk for pk in ids if pk not in changed]
+        })
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer],
+            content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """Stream all recipes of the user as NDJSON"""
+        queryset = self.queryset.filter(user=request.user).order_by('id')
+        lines = export_recipes(queryset, chunk_size=self.export_chunk_size)
+        if isinstance(request._request, ASGIRequest):
+            file, size = spool(lines)
+            response = FileResponse(
+                file,
+                content_type=NDJSONRenderer.media_type
+            )
+            response['Content-Length'] = size
+        else:
+            response = StreamingHttpResponse(
+                lines,
+                content_type=NDJSONRenderer.media_type
+            )
+        response['Content-Disposition'] = 'attachment; filename=recipes.ndjson'
+        return response
+
+
+class ChangeLogView(APIView):
+    """List the changes to the collection of the user after ?since=
+
+    Each change gives the type and id of an object with its current
+    representation, or deleted for a tombstone. Clients pass the seq of a
+    response as since to the next request. When the changes after since
+    have been compacted the response is 410 Gone, and clients reload the
+    lists before syncing from the seq it gives.
+    """
+
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    page_size = 500
+    max_page_size = 1000
+
+    def get(self, request):
+        since = param_to_int(request, 'since', 0)
+        page_size = min(
+            param_to_int(request, 'page_size', self.page_size),
+            self.max_page_size
+        ) or self.page_size
+        entries = list(ChangeLogEntry.objects.filter(
+            user=request.user,
+            seq__gt=since
+        ).order_by('seq').values_list(
+            'seq', 'model_name', 'object_id', 'deleted'
+        )[:page_size + 1])
+        # Checked after reading the entries, so a compaction in between
+        # can't drop tombstones from them unnoticed
+        version, compacted_seq = CollectionVersion.objects.filter(
+            user=request.user
+        ).values_list('version', 'compacted_seq').first() or (0, 0)
+        if since < compacted_seq:
+            return Response({
+                'detail': f'Changes before {compacted_seq} were compacted.',
+                'seq': version
+            }, status=status.HTTP_410_GONE)
+
+        more = len(entries) > page_size
+        entries = entries[:page_size]
+        seq = entries[-1][0] if entries else since
+        return Response({
+            'next': replace_query_param(
+                request.build_absolute_uri(), 'since', seq
+            ) if more else None,
+            'seq': seq,
+            'changes': self.represent_changes(request.user, entries)
+        })
+
+    def represent_changes(self, user, entries):
+        """Return the latest change of each object in the entries with the
+        current representation of the object"""
+        latest = {}
+        for entry in entries:
+            latest[entry[1:3]] = entry
+        changes = sorted(latest.values())
+        ids = {}
+        for _, model_name, object_id, deleted in changes:
+            if not deleted:
+                ids.setdefault(model_name, []).append(object_id)
+        objects = {
+            model_name: representations.fetch_objects(user, model_name, pks)
+            for model_name, pks in ids.items()
+        }
+        results = []
+        for seq, model_name, object_id, deleted in changes:
+            data = None if deleted else \
+                objects[model_name].get(object_id)
+            results.append({
+                'seq': seq,
+                'type': model_name,
+                'id': object_id,
+                'deleted': data is None,
+                'data': data
+            })
+        return results
@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
+from rest_framework.exceptions import Throttled
+
+from user.throttling import login_failures
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -23,11 +26,9 @@ class UserSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         """Update a user, setting a password correctly and return it"""
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
         if password:
-            user.set_password(password)
-            user.save()
-        return user
+            instance.set_password(password)
+        return super().update(instance, validated_data)
 
 
 class AuthTokenSerializer(serializers.Serializer):
@@ -43,15 +44,23 @@ class AuthTokenSerializer(serializers.Serializer):
         """Validate and authenticate the user"""
         email = attrs.get('email')
         password = attrs.get('password')
+        request = self.context.get('request')
+        address = request.META.get('REMOTE_ADDR') if request else None
+
+        # Refuse bursts of failures before spending time hashing
+        if login_failures.is_blocked(email, address):
+            raise Throttled(wait=login_failures.window)
 
         user = authenticate(
-            request=self.context.get('request'),
+            request=request,
             username=email,
             password=password
         )
         if not user:
+            login_failures.add(email, address)
             msg = _('Unable to authenticate user with provided credentials')
             raise serializers.ValidationError(msg, code='authentication')
 
+        login_failures.reset(email, address)
         attrs['user'] = user
         return attrs
@@ -1,10 +1,19 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.authentication import token_cache
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -18,6 +27,7 @@ class PublicUserAPITests(TestCase):
     """Tests the users API unauthenticated(create user only)"""
 
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.payload = {
             'email': 'test@mkznd.com',
@@ -78,6 +88,65 @@ class PublicUserAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertNotIn('token', res.data)
 
+    def test_create_token_failures_short_circuit(self):
+        """Test that repeated failures are refused without hashing"""
+        create_user(**self.payload)
+        self.payload['password'] = 'wrong'
+        for _ in range(5):
+            self.client.post(TOKEN_URL, self.payload)
+
+        with patch('user.serializers.authenticate') as auth:
+            res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        auth.assert_not_called()
+
+    def test_create_token_failures_per_address(self):
+        """Test that failures from one address don't lock the user out
+        from another"""
+        create_user(**self.payload)
+        wrong = {**self.payload, 'password': 'wrong'}
+        for _ in range(5):
+            self.client.post(TOKEN_URL, wrong, REMOTE_ADDR='10.0.0.2')
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_create_token_success_resets_failures(self):
+        """Test that a successful login forgets earlier failures"""
+        create_user(**self.payload)
+        wrong = {**self.payload, 'password': 'wrong'}
+        for _ in range(4):
+            self.client.post(TOKEN_URL, wrong)
+        self.client.post(TOKEN_URL, self.payload)
+
+        for _ in range(4):
+            self.client.post(TOKEN_URL, wrong)
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    ])
+    def test_create_token_rehashes_password(self):
+        """Test that logging in rehashes a password with the preferred
+        hasher"""
+        user = create_user(email=self.payload['email'])
+        user.password = make_password(
+            self.payload['password'],
+            hasher='pbkdf2_sha1'
+        )
+        user.save()
+
+        res = self.client.post(TOKEN_URL, self.payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
     def test_create_token_without_user(self):
         """Test that token is not created if the user does not exist"""
         res = self.client.post(TOKEN_URL, self.payload)
@@ -130,6 +199,21 @@ class PrivateUserAPITests(TestCase):
             'name': self.user.name
         })
 
+    def test_get_user_profile_cached_token(self):
+        """Test that a cached token serves the profile without queries"""
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+        client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = client.get(ME_URL)
+
+        self.assertEqual(res.data, {'email': self.user.email, 'name': 'Test'})
+
     def post_me_not_allowed(self):
         """Test that post on user page is not allowed
         (put and patch are used instead)"""
@@ -145,3 +229,14 @@ class PrivateUserAPITests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_user_password_single_update(self):
+        """Test that updating the password writes the user once"""
+        payload = {'name': 'new_name', 'password': 'new_password'}
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(ME_URL, payload)
+
+        updates = [query for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "core_user"')]
+        self.assertEqual(len(updates), 1)
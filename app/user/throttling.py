@@ -0,0 +1,61 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LoginFailures:
+    """Count failed logins per email from a client address and per address
+
+    Once either count reaches its limit within the window, further
+    attempts can be refused before any password is hashed. Emails are only
+    counted together with the address, so failures from one address can't
+    lock the owner of an email out from theirs. Guessing the password of
+    one account from many addresses is bounded by the address limit of
+    each of them instead.
+    """
+
+    key_prefix = 'login-failures:'
+
+    def __init__(self, alias, window, email_limit, address_limit):
+        self.alias = alias
+        self.window = window
+        self.limits = {'email': email_limit, 'address': address_limit}
+
+    def get_keys(self, email, address):
+        keys = {}
+        address = address or ''
+        for scope, value in (('email', f'{(email or "").lower()} {address}'),
+                             ('address', address)):
+            digest = hashlib.sha256(value.encode()).hexdigest()
+            keys[scope] = f'{self.key_prefix}{scope}:{digest}'
+        return keys
+
+    def is_blocked(self, email, address):
+        """Return whether the email or address failed too often"""
+        keys = self.get_keys(email, address)
+        counts = caches[self.alias].get_many(keys.values())
+        return any(counts.get(key, 0) >= self.limits[scope]
+                   for scope, key in keys.items())
+
+    def add(self, email, address):
+        """Count a failed login"""
+        cache = caches[self.alias]
+        for key in self.get_keys(email, address).values():
+            if not cache.add(key, 1, self.window):
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.set(key, 1, self.window)
+
+    def reset(self, email, address):
+        """Forget the failed logins for an email from an address"""
+        caches[self.alias].delete(self.get_keys(email, address)['email'])
+
+
+login_failures = LoginFailures(
+    alias=getattr(settings, 'LOGIN_FAILURE_CACHE_ALIAS', 'default'),
+    window=getattr(settings, 'LOGIN_FAILURE_WINDOW', 300),
+    email_limit=getattr(settings, 'LOGIN_FAILURE_EMAIL_LIMIT', 5),
+    address_limit=getattr(settings, 'LOGIN_FAILURE_ADDRESS_LIMIT', 50)
+)